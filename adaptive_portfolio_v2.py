@@ -4,9 +4,11 @@ Asymmetric risk bands + momentum override for better upside capture
 """
 import pandas as pd
 import numpy as np
-import os
 from datetime import datetime
-from enhanced_risk_analyzer import analyze_asset
+from concurrent.futures import ThreadPoolExecutor
+from enhanced_risk_analyzer import analyze_asset_extended
+from strategy_config import (UNIVERSE, FETCH_TICKERS, TICKERS, TIER, BASE, MIN_W, MAX_W,
+                             RISK_EXIT, RISK_REDUCE, MOONBAG, DAMPER_APPLIES, normalize_with_bounds)
 from enhanced_main import analyze_market_cycle
 
 # =====================================================
@@ -14,30 +16,7 @@ from enhanced_main import analyze_market_cycle
 # =====================================================
 PORTFOLIO_AUM = 100000
 MONTHLY_DCA = 3000
-
-# Asset Universe with ASYMMETRIC risk bands
-# Format: ticker: (base_weight, tier, min_w, max_w, risk_exit, risk_reduce, moonbag)
-ASSET_CONFIG = {
-    # Crypto - High volatility assets need WIDER bands
-    "BTC-USD": (0.18, "CRYPTO", 0.10, 0.30, 0.85, 0.75, 0.40),
-    "ETH-USD": (0.10, "CRYPTO", 0.05, 0.20, 0.85, 0.75, 0.40),
-    
-    # Broad Market - Medium bands
-    "VGS.AX": (0.15, "CORE", 0.10, 0.25, 0.80, 0.70, 0.20),
-    "VAS.AX": (0.15, "CORE", 0.10, 0.20, 0.80, 0.70, 0.20),
-    
-    # Commodities - Medium-tight bands
-    "GC=F": (0.08, "COMMODITY", 0.05, 0.15, 0.78, 0.68, 0.25),
-    "BHP.AX": (0.10, "COMMODITY", 0.05, 0.15, 0.75, 0.65, 0.25),
-    "RIO.AX": (0.07, "COMMODITY", 0.03, 0.12, 0.75, 0.65, 0.25),
-    
-    # Tech/Thematic - Tight bands (bubble-prone)
-    "FANG.AX": (0.10, "GROWTH", 0.05, 0.15, 0.75, 0.65, 0.20),
-    "NDQ.AX": (0.05, "GROWTH", 0.03, 0.10, 0.75, 0.65, 0.20),
-    
-    # Cash Reserve
-    "CASH": (0.02, "CORE", 0.00, 0.30, 1.0, 1.0, 0.0)
-}
+# Asset universe (UNIVERSE) and its column arrays are shared via strategy_config.py
 
 # New: Momentum Override Rules
 MOMENTUM_OVERRIDE = {
@@ -47,58 +26,45 @@ MOMENTUM_OVERRIDE = {
     "risk_extension": 0.05  # Allow +0.05 risk before selling
 }
 
+# First asset of each tier, used as that tier's row in the band-config report
+_TIER_SAMPLES = {spec.tier: spec for _, spec in reversed(UNIVERSE)}
+
 # =====================================================
 # CORE LOGIC V2
 # =====================================================
 
-def calculate_momentum_score(df, lookback=30):
-    """Calculate recent momentum to detect parabolic moves"""
-    if len(df) < lookback:
-        return 0.0
-    recent_return = (df['Close'].iloc[-1] / df['Close'].iloc[-lookback]) - 1
-    return recent_return
+def _fetch_risk_momentum(ticker):
+    """Worker: analyze one ticker, returning (risk, momentum, status line)"""
+    try:
+        _, _, meta = analyze_asset_extended(ticker)
+        if meta.get("reason"):
+            return None, None, f"  ⚠️  {ticker}: {meta['reason']}"
+        momentum = meta['momentum']
+        return meta['last_risk'], momentum, f"  ✓ {ticker}: Risk={meta['last_risk']:.2f}, Momentum={momentum:+.1%}"
+    except Exception as e:
+        return None, None, f"  ✗ {ticker}: Error - {e}"
 
 def get_risk_data_with_momentum():
     """Fetch risk scores + momentum for all assets"""
     print("Fetching risk + momentum data...")
-    risk_data = {}
-    momentum_data = {}
+    risk_data = {"CASH": 0.0}
+    momentum_data = {"CASH": 0.0}
     
-    for ticker in ASSET_CONFIG.keys():
-        if ticker == "CASH":
-            risk_data[ticker] = 0.0
-            momentum_data[ticker] = 0.0
-            continue
-            
-        try:
-            df, _, meta = analyze_asset(ticker)
-            if meta.get("reason"):
-                print(f"  ⚠️  {ticker}: {meta['reason']}")
-                risk_data[ticker] = None
-                momentum_data[ticker] = None
-            else:
-                risk_data[ticker] = meta['last_risk']
-                momentum_data[ticker] = calculate_momentum_score(df)
-                print(f"  ✓ {ticker}: Risk={meta['last_risk']:.2f}, Momentum={momentum_data[ticker]:+.1%}")
-        except Exception as e:
-            print(f"  ✗ {ticker}: Error - {e}")
-            risk_data[ticker] = None
-            momentum_data[ticker] = None
+    # Fetches are network-bound, so overlap them across tickers
+    with ThreadPoolExecutor(max_workers=len(FETCH_TICKERS)) as ex:
+        futures = {t: ex.submit(_fetch_risk_momentum, t) for t in FETCH_TICKERS}
+    
+    # Collect in config order so the log reads the same as a serial run
+    for ticker, future in futures.items():
+        risk_data[ticker], momentum_data[ticker], status = future.result()
+        print(status)
     
     return risk_data, momentum_data
 
-def calculate_adaptive_weights_v2(risk_data, momentum_data, macro_context):
+def calculate_adaptive_weights_v2(risk_data, momentum_data, composite_risk=0.5):
     """
     V2: Asset-specific risk bands + momentum override
     """
-    results = []
-    
-    # Macro Risk Adjustment
-    # Note: analyze_market_cycle doesn't return a direct composite_score yet in enhanced_main.py,
-    # but we can infer one from the macro_context or use a default.
-    # Refactoring it slightly to match the expected usage or using a safe default.
-    composite_risk = macro_context.get("composite_score", 0.5)
-    
     # Global damper (unchanged)
     global_damper = 1.0
     if composite_risk > 0.70:
@@ -109,115 +75,84 @@ def calculate_adaptive_weights_v2(risk_data, momentum_data, macro_context):
     print(f"\n📊 Macro Composite Risk: {composite_risk:.2f}")
     print(f"   Global Risk Damper: {global_damper:.1%}\n")
     
-    for ticker, (base_weight, tier, min_w, max_w, risk_exit, risk_reduce, moonbag) in ASSET_CONFIG.items():
-        risk_score = risk_data.get(ticker)
-        momentum = momentum_data.get(ticker, 0.0)
-        
-        # Skip if unavailable
-        if risk_score is None:
-            results.append({
-                "ticker": ticker,
-                "base_weight": base_weight,
-                "adjusted_weight": 0,
-                "risk_score": None,
-                "action": "SKIP (No Data)"
-            })
-            continue
-        
-        # MOMENTUM OVERRIDE: Extend risk tolerance in parabolic moves
-        effective_exit = risk_exit
-        effective_reduce = risk_reduce
-        
-        if MOMENTUM_OVERRIDE["enabled"] and momentum > MOMENTUM_OVERRIDE["threshold"]:
-            effective_exit += MOMENTUM_OVERRIDE["risk_extension"]
-            effective_reduce += MOMENTUM_OVERRIDE["risk_extension"]
-            momentum_flag = f" [🚀 Momentum: {momentum:+.1%}]"
-        else:
-            momentum_flag = ""
-        
-        # Position Sizing Logic
-        adjusted = base_weight
-        action = "HOLD"
-        
-        # 1. FULL EXIT: Risk > exit threshold
-        if risk_score > effective_exit:
-            adjusted = min_w
-            action = f"🔴 EXIT (Risk {risk_score:.2f} > {effective_exit:.2f}){momentum_flag}"
-        
-        # 2. MOONBAG: Risk > reduce threshold (take profits but keep exposure)
-        elif risk_score > effective_reduce:
-            # Scale to moonbag position
-            adjusted = base_weight * moonbag
-            adjusted = max(adjusted, min_w)
-            action = f"🟠 MOONBAG (Risk {risk_score:.2f}, Keep {moonbag:.0%}){momentum_flag}"
-        
-        # 3. VALUE ZONE: Overweight
-        elif risk_score < 0.30:
-            boost = 1.0 + ((0.30 - risk_score) / 0.30) * 0.5
-            adjusted = min(base_weight * boost, max_w)
-            action = f"🟢 OVERWEIGHT (Value {risk_score:.2f})"
-        
-        # 4. WARNING ZONE: Taper slightly
-        elif risk_score > (effective_reduce - 0.10):
-            taper = 0.85
-            adjusted = max(base_weight * taper, min_w)
-            action = f"🟡 REDUCE (Warning {risk_score:.2f})"
-        
-        # Apply macro damper only to non-core
-        if tier in ["GROWTH", "CRYPTO"]:
-            adjusted *= global_damper
-        
-        # Clamp to bounds
-        adjusted = max(min_w, min(adjusted, max_w))
-        
-        results.append({
-            "ticker": ticker,
-            "tier": tier,
-            "base_weight": base_weight,
-            "risk_score": risk_score,
-            "momentum": momentum,
-            "exit_threshold": effective_exit,
-            "adjusted_weight": adjusted,
-            "action": action
-        })
-    
-    # Normalize weights
-    total_weight = sum(r["adjusted_weight"] for r in results)
-    if total_weight > 0:
-        for r in results:
-            r["normalized_weight"] = r["adjusted_weight"] / total_weight
-    else:
-        for r in results:
-            r["normalized_weight"] = 0
-    
-    return pd.DataFrame(results)
+    # Missing data becomes NaN, which fails every band comparison below
+    risk = np.array([np.nan if risk_data.get(t) is None else risk_data[t] for t in TICKERS], dtype=np.float64)
+    momentum = np.array([momentum_data.get(t) or 0.0 for t in TICKERS], dtype=np.float64)
+    available = ~np.isnan(risk)
+    
+    # MOMENTUM OVERRIDE: Extend risk tolerance in parabolic moves
+    boosted = MOMENTUM_OVERRIDE["enabled"] & (momentum > MOMENTUM_OVERRIDE["threshold"])
+    extension = np.where(boosted, MOMENTUM_OVERRIDE["risk_extension"], 0.0)
+    effective_exit = RISK_EXIT + extension
+    effective_reduce = RISK_REDUCE + extension
+    
+    # Position Sizing Logic (np.select takes the first matching band, like the if/elif chain)
+    # 1. FULL EXIT  2. MOONBAG  3. VALUE ZONE (overweight)  4. WARNING ZONE (taper)  else HOLD
+    band = np.select(
+        [risk > effective_exit, risk > effective_reduce, risk < 0.30, risk > (effective_reduce - 0.10)],
+        [1, 2, 3, 4], default=0)
+    boost = 1.0 + ((0.30 - risk) / 0.30) * 0.5
+    adjusted = np.select(
+        [band == 1, band == 2, band == 3, band == 4],
+        [MIN_W, np.maximum(BASE * MOONBAG, MIN_W), np.minimum(BASE * boost, MAX_W),
+         np.maximum(BASE * 0.85, MIN_W)],
+        default=BASE)
+    
+    # Apply macro damper only to non-core
+    adjusted = np.where(DAMPER_APPLIES, adjusted * global_damper, adjusted)
+    
+    # Clamp to bounds
+    adjusted = np.maximum(MIN_W, np.minimum(adjusted, MAX_W))
+    
+    # Action labels: only the rows that land in each band get formatted
+    action = np.full(len(TICKERS), "HOLD", dtype=object)
+    action[~available] = "SKIP (No Data)"
+    momentum_flag = [f" [🚀 Momentum: {m:+.1%}]" if b else "" for m, b in zip(momentum, boosted)]
+    for i in np.flatnonzero(band == 1):
+        action[i] = f"🔴 EXIT (Risk {risk[i]:.2f} > {effective_exit[i]:.2f}){momentum_flag[i]}"
+    for i in np.flatnonzero(band == 2):
+        action[i] = f"🟠 MOONBAG (Risk {risk[i]:.2f}, Keep {MOONBAG[i]:.0%}){momentum_flag[i]}"
+    for i in np.flatnonzero(band == 3):
+        action[i] = f"🟢 OVERWEIGHT (Value {risk[i]:.2f})"
+    for i in np.flatnonzero(band == 4):
+        action[i] = f"🟡 REDUCE (Warning {risk[i]:.2f})"
+    
+    # Normalize weights (unavailable rows are pinned at zero)
+    adjusted = np.where(available, adjusted, 0.0)
+    normalized = np.zeros(len(TICKERS))
+    if adjusted.sum() > 0:
+        normalized = normalize_with_bounds(adjusted, np.where(available, MIN_W, 0.0), np.where(available, MAX_W, 0.0))
+    
+    # Fixed schema, one column per array; SKIP rows leave tier/momentum/threshold empty
+    return pd.DataFrame({
+        "ticker": TICKERS,
+        "tier": np.where(available, TIER, None),
+        "base_weight": BASE,
+        "risk_score": risk,
+        "momentum": np.where(available, momentum, np.nan),
+        "exit_threshold": np.where(available, effective_exit, np.nan),
+        "adjusted_weight": adjusted,
+        "action": action,
+        "normalized_weight": normalized,
+    })
 
 def generate_execution_plan(weights_df, current_holdings=None):
     """Generate buy/sell orders"""
     if current_holdings is None:
         current_holdings = {}
     
-    target_value = PORTFOLIO_AUM
-    orders = []
-    
-    for _, row in weights_df.iterrows():
-        ticker = row['ticker']
-        target_weight = row['normalized_weight']
-        target_value_asset = target_value * target_weight
-        
-        current_value = current_holdings.get(ticker, 0)
-        delta = target_value_asset - current_value
-        
-        if abs(delta) > 500:  # Min trade size $500
-            side = "BUY" if delta > 0 else "SELL"
-            orders.append({
-                "ticker": ticker,
-                "side": side,
-                "amount_aud": abs(delta),
-                "reason": row['action']
-            })
-    
-    return pd.DataFrame(orders)
+    tickers = weights_df['ticker'].to_numpy()
+    current = np.fromiter((current_holdings.get(t, 0) for t in tickers), dtype=np.float64, count=len(tickers))
+    target = PORTFOLIO_AUM * weights_df['normalized_weight'].to_numpy(dtype=np.float64)
+    delta = target - current
+    
+    trade = np.abs(delta) > 500  # Min trade size $500
+    return pd.DataFrame({
+        "ticker": tickers[trade],
+        "side": np.where(delta[trade] > 0, "BUY", "SELL"),
+        "amount_aud": np.abs(delta[trade]),
+        "reason": weights_df['action'].to_numpy()[trade]
+    })
 
 # =====================================================
 # MAIN
@@ -231,13 +166,16 @@ def run_adaptive_portfolio_v2():
     
     # 1. Macro Context
     cycle_report, macro_context = analyze_market_cycle()
+    # Note: analyze_market_cycle doesn't return a direct composite_score yet in enhanced_main.py,
+    # so fall back to a neutral default when it's missing.
+    macro_risk = macro_context.get("composite_score", 0.5)
     print(cycle_report)
     
     # 2. Get Risk + Momentum
     risk_data, momentum_data = get_risk_data_with_momentum()
     
     # 3. Calculate Adaptive Weights V2
-    weights_df = calculate_adaptive_weights_v2(risk_data, momentum_data, macro_context)
+    weights_df = calculate_adaptive_weights_v2(risk_data, momentum_data, macro_risk)
     
     # 4. Display
     print("\n" + "="*60)
@@ -254,8 +192,7 @@ def run_adaptive_portfolio_v2():
     print("="*60)
     orders_df = generate_execution_plan(weights_df)
     if not orders_df.empty:
-        orders_df['amount_aud'] = orders_df['amount_aud'].apply(lambda x: f"${x:,.0f}")
-        print(orders_df.to_string(index=False))
+        print(orders_df.to_string(index=False, formatters={'amount_aud': lambda x: f"${x:,.0f}"}))
     else:
         print("✓ Portfolio in balance - no trades needed")
     
@@ -268,7 +205,7 @@ def run_adaptive_portfolio_v2():
     print("="*60)
     print(f"Crypto Exposure:   {crypto_weight:.1%}")
     print(f"Core Exposure:     {core_weight:.1%}")
-    print(f"Macro Risk Score:  {macro_context.get('composite_score', 0):.2f}")
+    print(f"Macro Risk Score:  {macro_risk:.2f}")
     
     # 7. Strategy Configuration
     print("\n" + "="*60)
@@ -277,9 +214,9 @@ def run_adaptive_portfolio_v2():
     print("Asset Class    | Exit Threshold | Reduce Threshold | Moonbag")
     print("-" * 60)
     for tier in ["CRYPTO", "CORE", "COMMODITY", "GROWTH"]:
-        sample = next((v for v in ASSET_CONFIG.values() if v[1] == tier), None)
+        sample = _TIER_SAMPLES.get(tier)
         if sample:
-            print(f"{tier:<14} | {sample[4]:.2f}           | {sample[5]:.2f}             | {sample[6]:.0%}")
+            print(f"{tier:<14} | {sample.risk_exit:.2f}           | {sample.risk_reduce:.2f}             | {sample.moonbag:.0%}")
     
     return weights_df, orders_df
 
@@ -6,9 +6,11 @@ Risk-Adaptive Portfolio Manager v3.0
 """
 import pandas as pd
 import numpy as np
-import os
-from datetime import datetime, timedelta
-from enhanced_risk_analyzer import analyze_asset
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+from enhanced_risk_analyzer import analyze_asset_extended
+from strategy_config import (RULES, FETCH_TICKERS, TICKERS, TIER, BASE, MIN_W, MAX_W,
+                             RISK_EXIT, RISK_REDUCE, MOONBAG, DAMPER_APPLIES, normalize_with_bounds)
 from enhanced_main import analyze_market_cycle
 
 # =====================================================
@@ -16,47 +18,33 @@ from enhanced_main import analyze_market_cycle
 # =====================================================
 PORTFOLIO_AUM = 100000
 MONTHLY_DCA = 3000
+# Asset universe (UNIVERSE) and its column arrays are shared via strategy_config.py
 
-# Asset Universe
-# Format: ticker: (weight, tier, min_w, max_w, risk_exit, risk_reduce, moonbag_base)
-ASSET_CONFIG = {
-    "BTC-USD": (0.18, "CRYPTO", 0.10, 0.30, 0.85, 0.75, 0.40),
-    "ETH-USD": (0.10, "CRYPTO", 0.05, 0.20, 0.85, 0.75, 0.40),
-    "VGS.AX": (0.15, "CORE", 0.10, 0.25, 0.80, 0.70, 0.20),
-    "VAS.AX": (0.15, "CORE", 0.10, 0.20, 0.80, 0.70, 0.20),
-    "GC=F": (0.08, "COMMODITY", 0.05, 0.15, 0.78, 0.68, 0.25),
-    "BHP.AX": (0.10, "COMMODITY", 0.05, 0.15, 0.75, 0.65, 0.25),
-    "RIO.AX": (0.07, "COMMODITY", 0.03, 0.12, 0.75, 0.65, 0.25),
-    "FANG.AX": (0.10, "GROWTH", 0.05, 0.15, 0.75, 0.65, 0.20),
-    "NDQ.AX": (0.05, "GROWTH", 0.03, 0.10, 0.75, 0.65, 0.20),
-    "CASH": (0.02, "CORE", 0.00, 0.30, 1.0, 1.0, 0.0)
-}
-
-# V3: Advanced Configuration
+# V3: Advanced Configuration (thresholds come from strategy_config.RULES, shared with the backtests)
 REGIME_DETECTION = {
     "enabled": True,
-    "bull_threshold": 0.35,     # Risk < 0.35 = bull accumulation
-    "bear_threshold": 0.65,     # Risk > 0.65 = distribution
-    "lookback_days": 90         # Regime stability window
+    "bull_threshold": RULES["bull_threshold"],   # Risk < 0.35 = bull accumulation
+    "bear_threshold": RULES["bear_threshold"],   # Risk > 0.65 = distribution
+    "lookback_days": RULES["regime_lookback"]    # Regime stability window
 }
 
 CONVICTION_HOLD = {
     "enabled": True,
-    "min_hold_days": 45,        # Don't sell for 45 days after BUY
-    "exception_threshold": 0.95 # Unless risk hits extreme (0.95)
+    "min_hold_days": RULES["min_hold_days"],             # Don't sell for 45 days after BUY
+    "exception_threshold": RULES["exception_threshold"]  # Unless risk hits extreme (0.95)
 }
 
 DYNAMIC_MOONBAG = {
     "enabled": True,
     "base_multiplier": 1.0,
-    "momentum_bonus": 0.5,      # +50% moonbag if momentum strong
-    "max_moonbag": 0.70         # Cap at 70% retention
+    "momentum_bonus": RULES["momentum_bonus"],  # +50% moonbag if momentum strong
+    "max_moonbag": RULES["max_moonbag"]         # Cap at 70% retention
 }
 
 MULTI_TIMEFRAME = {
     "enabled": True,
-    "confirmation_days": 5,     # Risk must stay high for 5 days
-    "spike_tolerance": 0.08     # Allow single-day +0.08 spike
+    "confirmation_days": RULES["confirmation_days"],  # Risk must stay high for 5 days
+    "spike_tolerance": RULES["spike_tolerance"]       # Allow single-day +0.08 spike
 }
 
 # Trade tracking (in-memory for demo, use DB in production)
@@ -66,7 +54,7 @@ TRADE_HISTORY = {}
 # V3: REGIME DETECTION
 # =====================================================
 
-def detect_market_regime(df, lookback=90):
+def detect_market_regime(df, lookback=REGIME_DETECTION["lookback_days"]):
     """
     Determine if asset is in accumulation/distribution/transition
     Returns: ("BULL", "BEAR", "NEUTRAL", avg_risk)
@@ -74,7 +62,7 @@ def detect_market_regime(df, lookback=90):
     if len(df) < lookback:
         return "NEUTRAL", 0.5
     
-    recent_risk = df['risk_total'].iloc[-lookback:].mean()
+    recent_risk = df['risk_total'].to_numpy()[-lookback:].mean()
     
     if recent_risk < REGIME_DETECTION["bull_threshold"]:
         return "BULL", recent_risk
@@ -83,70 +71,55 @@ def detect_market_regime(df, lookback=90):
     else:
         return "NEUTRAL", recent_risk
 
-# =====================================================
-# V3: MOMENTUM + REGIME SCORING
-# =====================================================
-
-def calculate_momentum_score(df, lookback=30):
-    """30-day momentum"""
-    if len(df) < lookback:
-        return 0.0
-    return (df['Close'].iloc[-1] / df['Close'].iloc[-lookback]) - 1
-
-def calculate_trend_strength(df, lookback=90):
-    """90-day trend consistency (% days above MA50)"""
-    if len(df) < lookback:
-        return 0.5
-    
-    recent = df.iloc[-lookback:]
-    ma50 = recent['Close'].rolling(50).mean()
-    above_ma = (recent['Close'] > ma50).sum() / len(recent)
-    return above_ma
+def _fetch_enhanced_metrics(ticker):
+    """Worker: analyze one ticker, returning (asset dict, status line)"""
+    try:
+        df, _, meta = analyze_asset_extended(ticker)
+        
+        if meta.get("reason"):
+            return {"available": False}, f"  ⚠️  {ticker}: {meta['reason']}"
+        
+        regime, avg_risk = detect_market_regime(df)
+        momentum = meta['momentum']
+        trend = meta['trend_strength']
+        
+        data = {
+            "risk": meta['last_risk'],
+            "momentum": momentum,
+            "regime": regime,
+            "regime_avg_risk": avg_risk,
+            "trend_strength": trend,
+            "available": True,
+            # Only the tail the spike check reads, so the full history can be freed
+            "recent_risk": df['risk_total'].to_numpy()[-MULTI_TIMEFRAME["confirmation_days"]:].copy()
+        }
+        return data, f"  ✓ {ticker}: Risk={meta['last_risk']:.2f} | Regime={regime} | Momentum={momentum:+.1%}"
+        
+    except Exception as e:
+        return {"available": False}, f"  ✗ {ticker}: {e}"
 
 def get_enhanced_risk_data():
     """Fetch risk + momentum + regime for all assets"""
     print("Fetching enhanced risk metrics...")
     
-    data = {}
-    
-    for ticker in ASSET_CONFIG.keys():
-        if ticker == "CASH":
-            data[ticker] = {
-                "risk": 0.0,
-                "momentum": 0.0,
-                "regime": "NEUTRAL",
-                "trend_strength": 0.5,
-                "available": True
-            }
-            continue
-        
-        try:
-            df, _, meta = analyze_asset(ticker)
-            
-            if meta.get("reason"):
-                print(f"  ⚠️  {ticker}: {meta['reason']}")
-                data[ticker] = {"available": False}
-                continue
-            
-            regime, avg_risk = detect_market_regime(df)
-            momentum = calculate_momentum_score(df)
-            trend = calculate_trend_strength(df)
-            
-            data[ticker] = {
-                "risk": meta['last_risk'],
-                "momentum": momentum,
-                "regime": regime,
-                "regime_avg_risk": avg_risk,
-                "trend_strength": trend,
-                "available": True,
-                "df": df  # Keep for history checks
-            }
-            
-            print(f"  ✓ {ticker}: Risk={meta['last_risk']:.2f} | Regime={regime} | Momentum={momentum:+.1%}")
-            
-        except Exception as e:
-            print(f"  ✗ {ticker}: {e}")
-            data[ticker] = {"available": False}
+    data = {
+        "CASH": {
+            "risk": 0.0,
+            "momentum": 0.0,
+            "regime": "NEUTRAL",
+            "trend_strength": 0.5,
+            "available": True
+        }
+    }
+    
+    # Fetches are network-bound, so overlap them across tickers
+    with ThreadPoolExecutor(max_workers=len(FETCH_TICKERS)) as ex:
+        futures = {t: ex.submit(_fetch_enhanced_metrics, t) for t in FETCH_TICKERS}
+    
+    # Collect in config order so the log reads the same as a serial run
+    for ticker, future in futures.items():
+        data[ticker], status = future.result()
+        print(status)
     
     return data
 
@@ -154,19 +127,15 @@ def get_enhanced_risk_data():
 # V3: POSITION LOGIC WITH CONVICTION HOLD
 # =====================================================
 
-def should_hold_on_conviction(ticker, risk_score):
+def should_hold_on_conviction(last_buy, risk_score, now):
     """Check if we're in conviction hold period"""
     if not CONVICTION_HOLD["enabled"]:
         return False
     
-    if ticker not in TRADE_HISTORY:
-        return False
-    
-    last_buy = TRADE_HISTORY[ticker].get("last_buy_date")
     if last_buy is None:
         return False
     
-    days_held = (datetime.now() - last_buy).days
+    days_held = (now - last_buy).days
     
     # Exception: Risk hits extreme (0.95+)
     if risk_score > CONVICTION_HOLD["exception_threshold"]:
@@ -180,12 +149,10 @@ def check_multi_timeframe_confirmation(ticker, current_risk, asset_data):
     if not MULTI_TIMEFRAME["enabled"]:
         return True  # Skip check
     
-    df = asset_data.get("df")
-    if df is None or len(df) < MULTI_TIMEFRAME["confirmation_days"]:
+    recent_risks = asset_data.get("recent_risk")
+    if recent_risks is None or len(recent_risks) < MULTI_TIMEFRAME["confirmation_days"]:
         return True
     
-    # Check last N days of risk
-    recent_risks = df['risk_total'].iloc[-MULTI_TIMEFRAME["confirmation_days"]:]
     avg_recent = recent_risks.mean()
     
     # If current risk is a spike but average is lower, wait for confirmation
@@ -219,11 +186,11 @@ def calculate_dynamic_moonbag(base_moonbag, momentum, regime):
 # V3: ADAPTIVE WEIGHTS WITH ALL ENHANCEMENTS
 # =====================================================
 
-def calculate_adaptive_weights_v3(asset_data, macro_context):
+def calculate_adaptive_weights_v3(asset_data, composite_risk=0.5):
     """V3: Regime-aware, conviction-based position sizing"""
     
-    results = []
-    composite_risk = macro_context.get("composite_score", 0.5)
+    # One clock read per rebalance so every hold/trade decision sees the same time
+    now = datetime.now()
     
     # Global damper
     global_damper = 1.0
@@ -235,121 +202,91 @@ def calculate_adaptive_weights_v3(asset_data, macro_context):
     print(f"\n📊 Macro Composite Risk: {composite_risk:.2f}")
     print(f"   Global Risk Damper: {global_damper:.1%}\n")
     
-    for ticker, (base_weight, tier, min_w, max_w, risk_exit, risk_reduce, moonbag_base) in ASSET_CONFIG.items():
-        
-        data = asset_data.get(ticker, {})
-        
-        if not data.get("available", False):
-            results.append({
-                "ticker": ticker,
-                "action": "SKIP (No Data)",
-                "normalized_weight": 0
-            })
-            continue
-        
-        risk = data["risk"]
-        momentum = data["momentum"]
-        regime = data["regime"]
-        trend_strength = data.get("trend_strength", 0.5)
-        
-        # CONVICTION HOLD CHECK
-        if should_hold_on_conviction(ticker, risk):
-            days_left = CONVICTION_HOLD["min_hold_days"] - (datetime.now() - TRADE_HISTORY[ticker]["last_buy_date"]).days
-            results.append({
-                "ticker": ticker,
-                "tier": tier,
-                "risk_score": risk,
-                "regime": regime,
-                "adjusted_weight": base_weight,
-                "normalized_weight": base_weight,
-                "action": f"🔒 CONVICTION HOLD ({days_left}d remaining)"
-            })
-            continue
-        
-        # REGIME-BASED EXIT EXTENSION
-        effective_exit = risk_exit
-        effective_reduce = risk_reduce
-        
-        if regime == "BULL":
-            effective_exit += 0.05
-            effective_reduce += 0.05
-        
-        # MOMENTUM OVERRIDE
-        if momentum > 0.15:
-            effective_exit += 0.05
-            effective_reduce += 0.05
-        
-        # MULTI-TIMEFRAME CHECK
-        if risk > effective_reduce:
-            confirmed = check_multi_timeframe_confirmation(ticker, risk, data)
-            if not confirmed:
-                results.append({
-                    "ticker": ticker,
-                    "tier": tier,
-                    "risk_score": risk,
-                    "regime": regime,
-                    "adjusted_weight": base_weight,
-                    "normalized_weight": base_weight,
-                    "action": f"⏸️  WAIT (Risk spike unconfirmed)"
-                })
-                continue
-        
-        # POSITION SIZING
-        adjusted = base_weight
-        action = "HOLD"
-        
-        # 1. FULL EXIT
-        if risk > effective_exit:
-            adjusted = min_w
-            action = f"🔴 EXIT (Risk {risk:.2f} > {effective_exit:.2f})"
-            TRADE_HISTORY[ticker] = {"last_buy_date": None, "last_sell_date": datetime.now()}
-        
-        # 2. DYNAMIC MOONBAG
-        elif risk > effective_reduce:
-            moonbag_pct = calculate_dynamic_moonbag(moonbag_base, momentum, regime)
-            adjusted = base_weight * moonbag_pct
-            adjusted = max(adjusted, min_w)
-            action = f"🟠 MOONBAG (Risk {risk:.2f}, Keep {moonbag_pct:.0%})"
-        
-        # 3. VALUE ZONE
-        elif risk < 0.30:
-            boost = 1.0 + ((0.30 - risk) / 0.30) * 0.5
-            adjusted = min(base_weight * boost, max_w)
-            action = f"🟢 OVERWEIGHT (Value {risk:.2f}, {regime})"
-            if ticker not in TRADE_HISTORY or TRADE_HISTORY[ticker].get("last_buy_date") is None:
-                TRADE_HISTORY[ticker] = {"last_buy_date": datetime.now()}
-        
-        # 4. WARNING ZONE
-        elif risk > (effective_reduce - 0.10):
-            taper = 0.85
-            adjusted = max(base_weight * taper, min_w)
-            action = f"🟡 REDUCE (Warning {risk:.2f})"
-        
-        # Apply damper
-        if tier in ["GROWTH", "CRYPTO"] and regime != "BULL":
-            adjusted *= global_damper
-        
-        adjusted = max(min_w, min(adjusted, max_w))
-        
-        results.append({
-            "ticker": ticker,
-            "tier": tier,
-            "risk_score": risk,
-            "regime": regime,
-            "momentum": momentum,
-            "trend_strength": trend_strength,
-            "exit_threshold": effective_exit,
-            "adjusted_weight": adjusted,
-            "action": action
-        })
-    
-    # Normalize
-    total_weight = sum(r.get("adjusted_weight", 0) for r in results)
-    if total_weight > 0:
-        for r in results:
-            r["normalized_weight"] = r.get("adjusted_weight", 0) / total_weight
-    
-    return pd.DataFrame(results)
+    datas = [asset_data.get(t, {}) for t in TICKERS]
+    available = np.array([d.get("available", False) for d in datas], dtype=bool)
+    risk = np.array([d["risk"] if ok else np.nan for d, ok in zip(datas, available)], dtype=np.float64)
+    momentum = np.array([d["momentum"] if ok else 0.0 for d, ok in zip(datas, available)], dtype=np.float64)
+    regime = np.array([d["regime"] if ok else "NEUTRAL" for d, ok in zip(datas, available)], dtype=object)
+    trend_strength = np.array([d.get("trend_strength", 0.5) for d in datas], dtype=np.float64)
+    
+    # CONVICTION HOLD CHECK (one TRADE_HISTORY read per ticker, reused below)
+    last_buy = [(TRADE_HISTORY.get(t) or {}).get("last_buy_date") for t in TICKERS]
+    conviction = np.array([bool(ok) and should_hold_on_conviction(lb, r, now)
+                           for lb, ok, r in zip(last_buy, available, risk)], dtype=bool)
+    
+    # REGIME-BASED EXIT EXTENSION + MOMENTUM OVERRIDE
+    bull = regime == "BULL"
+    extension_regime = np.where(bull, 0.05, 0.0)
+    extension_momentum = np.where(momentum > 0.15, 0.05, 0.0)
+    effective_exit = RISK_EXIT + extension_regime + extension_momentum
+    effective_reduce = RISK_REDUCE + extension_regime + extension_momentum
+    
+    # MULTI-TIMEFRAME CHECK (only for live signals above the reduce band)
+    unconfirmed = np.zeros(len(TICKERS), dtype=bool)
+    for i in np.flatnonzero(available & ~conviction & (risk > effective_reduce)):
+        unconfirmed[i] = not check_multi_timeframe_confirmation(TICKERS[i], risk[i], datas[i])
+    
+    # POSITION SIZING (np.select takes the first matching band, like the if/elif chain)
+    # 1. FULL EXIT  2. DYNAMIC MOONBAG  3. VALUE ZONE  4. WARNING ZONE  else HOLD
+    band = np.select(
+        [risk > effective_exit, risk > effective_reduce, risk < 0.30, risk > (effective_reduce - 0.10)],
+        [1, 2, 3, 4], default=0)
+    moonbag_pct = np.array([calculate_dynamic_moonbag(mb, m, rg) for mb, m, rg in zip(MOONBAG, momentum, regime)])
+    boost = 1.0 + ((0.30 - risk) / 0.30) * 0.5
+    adjusted = np.select(
+        [band == 1, band == 2, band == 3, band == 4],
+        [MIN_W, np.maximum(BASE * moonbag_pct, MIN_W), np.minimum(BASE * boost, MAX_W),
+         np.maximum(BASE * 0.85, MIN_W)],
+        default=BASE)
+    
+    # Apply damper
+    adjusted = np.where(DAMPER_APPLIES & ~bull, adjusted * global_damper, adjusted)
+    adjusted = np.maximum(MIN_W, np.minimum(adjusted, MAX_W))
+    
+    # Conviction holds and unconfirmed spikes keep their base weight untouched
+    held = conviction | unconfirmed
+    live = available & ~held
+    adjusted = np.where(held, BASE, adjusted)
+    
+    # Action labels (and trade-history updates) only for the rows in each band
+    action = np.full(len(TICKERS), "HOLD", dtype=object)
+    action[~available] = "SKIP (No Data)"
+    action[unconfirmed] = "⏸️  WAIT (Risk spike unconfirmed)"
+    for i in np.flatnonzero(conviction):
+        days_left = CONVICTION_HOLD["min_hold_days"] - (now - last_buy[i]).days
+        action[i] = f"🔒 CONVICTION HOLD ({days_left}d remaining)"
+    for i in np.flatnonzero(live & (band == 1)):
+        action[i] = f"🔴 EXIT (Risk {risk[i]:.2f} > {effective_exit[i]:.2f})"
+        TRADE_HISTORY[TICKERS[i]] = {"last_buy_date": None, "last_sell_date": now}
+    for i in np.flatnonzero(live & (band == 2)):
+        action[i] = f"🟠 MOONBAG (Risk {risk[i]:.2f}, Keep {moonbag_pct[i]:.0%})"
+    for i in np.flatnonzero(live & (band == 3)):
+        action[i] = f"🟢 OVERWEIGHT (Value {risk[i]:.2f}, {regime[i]})"
+        if last_buy[i] is None:
+            TRADE_HISTORY[TICKERS[i]] = {"last_buy_date": now}
+    for i in np.flatnonzero(live & (band == 4)):
+        action[i] = f"🟡 REDUCE (Warning {risk[i]:.2f})"
+    
+    # Normalize (unavailable rows are pinned at zero)
+    weights = np.where(available, adjusted, 0.0)
+    if weights.sum() > 0:
+        normalized = normalize_with_bounds(weights, np.where(available, MIN_W, 0.0), np.where(available, MAX_W, 0.0))
+    else:
+        normalized = np.where(held, BASE, np.where(available, np.nan, 0.0))
+    
+    # Fixed schema, one column per array; SKIP and held rows leave the scoring columns empty
+    return pd.DataFrame({
+        "ticker": TICKERS,
+        "tier": np.where(available, TIER, None),
+        "risk_score": risk,
+        "regime": np.where(available, regime, None),
+        "momentum": np.where(live, momentum, np.nan),
+        "trend_strength": np.where(live, trend_strength, np.nan),
+        "exit_threshold": np.where(live, effective_exit, np.nan),
+        "adjusted_weight": np.where(available, adjusted, np.nan),
+        "action": action,
+        "normalized_weight": normalized,
+    })
 
 # =====================================================
 # MAIN V3
@@ -363,13 +300,14 @@ def run_adaptive_portfolio_v3():
     
     # 1. Macro
     cycle_report, macro_context = analyze_market_cycle()
+    macro_risk = macro_context.get("composite_score", 0.5)
     print(cycle_report)
     
     # 2. Enhanced Risk Data
     asset_data = get_enhanced_risk_data()
     
     # 3. V3 Weights
-    weights_df = calculate_adaptive_weights_v3(asset_data, macro_context)
+    weights_df = calculate_adaptive_weights_v3(asset_data, macro_risk)
     
     # 4. Display
     print("\n" + "="*70)
@@ -378,12 +316,10 @@ def run_adaptive_portfolio_v3():
     display_cols = ['ticker', 'tier', 'risk_score', 'regime', 'momentum', 
                     'normalized_weight', 'action']
     
-    display_df = weights_df[display_cols].copy()
-    for col in ['risk_score', 'momentum', 'normalized_weight']:
-        if col in display_df.columns:
-            display_df[col] = display_df[col].apply(lambda x: f"{x:.2f}" if pd.notna(x) and isinstance(x, (int, float)) else x)
-    
-    print(display_df.to_string(index=False))
+    # Format at print time so the numeric columns keep their float dtype
+    fmt2 = lambda x: "NaN" if pd.isna(x) else f"{x:.2f}"
+    formatters = {col: fmt2 for col in ['risk_score', 'momentum', 'normalized_weight']}
+    print(weights_df[display_cols].to_string(index=False, formatters=formatters))
     
     # 5. Risk Profile
     if 'tier' in weights_df.columns and 'normalized_weight' in weights_df.columns:
@@ -395,7 +331,7 @@ def run_adaptive_portfolio_v3():
         print("="*70)
         print(f"Crypto Exposure:   {crypto_weight:.1%}")
         print(f"Core Exposure:     {core_weight:.1%}")
-        print(f"Macro Risk Score:  {macro_context.get('composite_score', 0):.2f}")
+        print(f"Macro Risk Score:  {macro_risk:.2f}")
     
     # 6. Feature Status
     print("\n" + "="*70)
@@ -1,156 +1,271 @@
+import os
 import pandas as pd
 import numpy as np
-import os
-from datetime import datetime, timedelta
-from enhanced_risk_analyzer import analyze_asset
-
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from itertools import product
+from enhanced_risk_analyzer import cached_analyze_asset, fetch_many, uncached_tickers
+from numba_compat import njit
 # Use v3 CONFIG & Rules
-ASSET_CONFIG = {
-    "BTC-USD": (0.18, "CRYPTO", 0.10, 0.30, 0.85, 0.75, 0.40),
-    "ETH-USD": (0.10, "CRYPTO", 0.05, 0.20, 0.85, 0.75, 0.40),
-    "VGS.AX": (0.15, "CORE", 0.10, 0.25, 0.80, 0.70, 0.20),
-    "VAS.AX": (0.15, "CORE", 0.10, 0.20, 0.80, 0.70, 0.20),
-    "GC=F": (0.08, "COMMODITY", 0.05, 0.15, 0.78, 0.68, 0.25),
-    "BHP.AX": (0.10, "COMMODITY", 0.05, 0.15, 0.75, 0.65, 0.25),
-    "RIO.AX": (0.07, "COMMODITY", 0.03, 0.12, 0.75, 0.65, 0.25),
-    "FANG.AX": (0.10, "GROWTH", 0.05, 0.15, 0.75, 0.65, 0.20),
-    "NDQ.AX": (0.05, "GROWTH", 0.03, 0.10, 0.75, 0.65, 0.20),
-}
-
-RULES = {
-    "regime_lookback": 90,
-    "bull_threshold": 0.35,
-    "bear_threshold": 0.65,
-    "min_hold_days": 45,
-    "exception_threshold": 0.95,
-    "confirmation_days": 5,
-    "spike_tolerance": 0.08,
-    "momentum_bonus": 0.5,
-    "max_moonbag": 0.70
-}
-
-def calculate_metrics(df, initial_capital, risk_free_rate=0.04):
-    final_val = df['strat_value'].iloc[-1]
+from strategy_config import RULES, CONFIG_ARR, TICKER_IDX
+
+@lru_cache(maxsize=64)
+def _load_history(ticker):
+    """
+    In-process memo over the same-day disk cache, so repeated runs on one ticker
+    (sweeps, reruns) skip even the parquet read. Callers must copy before writing.
+    """
+    df, _, _ = cached_analyze_asset(ticker)
+    return df
+
+@njit(cache=True)
+def _max_drawdown(value):
+    """Forward peak scan; NaN bars are skipped the way cummax/min skip them."""
+    peak = np.nan
+    max_dd = np.nan
+    for v in value:
+        if np.isnan(v): continue
+        if np.isnan(peak) or v > peak: peak = v
+        dd = (v - peak) / peak
+        if np.isnan(max_dd) or dd < max_dd: max_dd = dd
+    return max_dd
+
+@njit(cache=True)
+def _metrics_core(strat_value, strat_ret, bh_value, years, initial_capital, risk_free_rate, freq):
+    """Compiled body of calculate_metrics: (cagr, sharpe, max_dd, bh_cagr, bh_max_dd)."""
+    cagr = (strat_value[-1] / initial_capital)**(1/years) - 1 if years > 0 else 0.0
+    bh_cagr = (bh_value[-1] / initial_capital)**(1/years) - 1 if years > 0 else 0.0
+
+    # Mean / sample std of the non-NaN daily returns
+    n = 0
+    total = 0.0
+    for r in strat_ret:
+        if not np.isnan(r):
+            n += 1
+            total += r
+    mean = total / n if n > 0 else np.nan
+    sq = 0.0
+    for r in strat_ret:
+        if not np.isnan(r):
+            sq += (r - mean)**2
+    ann_vol = np.sqrt(sq / (n - 1)) * np.sqrt(freq) if n > 1 else np.nan
+    ann_ret = mean * freq
+    sharpe = (ann_ret - risk_free_rate) / ann_vol if ann_vol > 0 else 0.0
+
+    return cagr, sharpe, _max_drawdown(strat_value), bh_cagr, _max_drawdown(bh_value)
+
+def calculate_metrics(df, initial_capital, freq=365, risk_free_rate=0.04):
+    """`freq` is bars per year: 365 for 24/7 markets, 252 for exchange-traded ones."""
     days = (df.index[-1] - df.index[0]).days
     years = days / 365.25
-    cagr = (final_val / initial_capital)**(1/years) - 1 if years > 0 else 0
-    
-    daily_rets = df['strat_ret'].dropna()
-    # Approx check for ASX vs Global
-    is_asx = "AX" in str(df.index.dtype) if hasattr(df, 'index') else False
-    freq = 252 if is_asx else 365
-    ann_vol = daily_rets.std() * np.sqrt(freq)
-    ann_ret = daily_rets.mean() * freq
-    sharpe = (ann_ret - risk_free_rate) / ann_vol if ann_vol > 0 else 0
-    
-    bh_final = df['bh_value'].iloc[-1]
-    bh_cagr = (bh_final / initial_capital)**(1/years) - 1 if years > 0 else 0
-    
-    strat_peak = df['strat_value'].cummax()
-    max_dd = ((df['strat_value'] - strat_peak) / strat_peak).min()
-    
-    bh_peak = df['bh_value'].cummax()
-    bh_max_dd = ((df['bh_value'] - bh_peak) / bh_peak).min()
+
+    cagr, sharpe, max_dd, bh_cagr, bh_max_dd = _metrics_core(
+        df['strat_value'].to_numpy(dtype=np.float64), df['strat_ret'].to_numpy(dtype=np.float64),
+        df['bh_value'].to_numpy(dtype=np.float64), years, float(initial_capital),
+        risk_free_rate, freq)
     
     return {
         "cagr": cagr, "sharpe": sharpe, "max_dd": max_dd,
         "bh_cagr": bh_cagr, "bh_max_dd": bh_max_dd
     }
 
-def run_backtest_v3(ticker, years=5, initial_capital=10000, fee=0.001):
-    """v3 Backtest: Iterative state-based simulation"""
-    df, _, _ = analyze_asset(ticker)
-    start_date = pd.Timestamp.now() - pd.DateOffset(years=years)
-    df = df[df.index >= start_date].copy()
-    if len(df) < 150: return None
+@njit(cache=True)
+def equity_curve(close, position, fee, initial_capital):
+    """
+    Fused position -> trades -> returns -> equity pass.
+    Row 0 has no prior bar, so its returns and values are NaN (same as pct_change/cumprod).
+    """
+    n = close.size
+    trade = np.empty(n)
+    raw_ret = np.empty(n)
+    strat_ret = np.empty(n)
+    bh_value = np.empty(n)
+    strat_value = np.empty(n)
+    if n == 0:
+        return trade, raw_ret, strat_ret, bh_value, strat_value
+
+    trade[0] = 0.0
+    raw_ret[0] = np.nan
+    strat_ret[0] = np.nan
+    bh_value[0] = np.nan
+    strat_value[0] = np.nan
+
+    bh = initial_capital
+    strat = initial_capital
+    for i in range(1, n):
+        trade[i] = abs(position[i] - position[i - 1])
+        raw_ret[i] = close[i] / close[i - 1] - 1.0
+        strat_ret[i] = position[i - 1] * raw_ret[i] - trade[i] * fee
+        bh *= 1.0 + raw_ret[i]
+        strat *= 1.0 + strat_ret[i]
+        bh_value[i] = bh
+        strat_value[i] = strat
+    return trade, raw_ret, strat_ret, bh_value, strat_value
+
+_NS_PER_DAY = 86_400_000_000_000
+
+@njit(cache=True)
+def _simulate(risk, momentum, t_ns, r_exit, r_reduce, mbag_base, regime_lookback, bull_thr, bear_thr,
+              min_hold_days, exception_thr, conf_days, spike_tol, mom_bonus, max_mbag):
+    """
+    v3 state machine over one price history, returning the position per bar.
+    The regime and confirmation windows are trailing means kept as running sums,
+    and the last buy date is an int64 nanosecond timestamp (has_buy marks "set").
+    Regime codes: 0 NEUTRAL, 1 BULL, 2 BEAR.
+    """
+    n = risk.size
+    positions = np.empty(n)
+    regime_sum = 0.0
+    conf_sum = 0.0
+    has_buy = False
+    last_buy_ns = 0
+    prev_pos = 1.0
+    for i in range(n):
+        # 1. Regime Detection (mean of the previous regime_lookback bars)
+        regime = 0
+        if i >= regime_lookback:
+            avg_risk = regime_sum / regime_lookback
+            if avg_risk < bull_thr: regime = 1
+            elif avg_risk > bear_thr: regime = 2
+
+        current_risk = risk[i]
+        mom = momentum[i]
 
-    # Config
-    base_w, tier, min_w, max_w, r_exit, r_reduce, mbag_base = ASSET_CONFIG.get(ticker, (0.1, "CORE", 0.05, 0.15, 0.75, 0.65, 0.2))
-    
-    # Pre-calculate indicators
-    df['ma50'] = df['Close'].rolling(50).mean()
-    df['momentum_30'] = df['Close'].pct_change(30)
-    
-    # State tracking
-    last_buy_date = None
-    positions = []
-    
-    # Simulation loop
-    risk_col = 'risk_total'
-    for i in range(len(df)):
-        # 1. Regime Detection (90d lookback)
-        if i < RULES["regime_lookback"]:
-            regime = "NEUTRAL"
-        else:
-            avg_risk = df[risk_col].iloc[i-RULES["regime_lookback"]:i].mean()
-            if avg_risk < RULES["bull_threshold"]: regime = "BULL"
-            elif avg_risk > RULES["bear_threshold"]: regime = "BEAR"
-            else: regime = "NEUTRAL"
-            
-        current_risk = df[risk_col].iloc[i]
-        current_date = df.index[i]
-        momentum = df['momentum_30'].iloc[i]
-        
         # 2. Conviction Hold
         in_conviction = False
-        if last_buy_date:
-            days_held = (current_date - last_buy_date).days
-            if days_held < RULES["min_hold_days"] and current_risk < RULES["exception_threshold"]:
+        if has_buy:
+            days_held = (t_ns[i] - last_buy_ns) // _NS_PER_DAY
+            if days_held < min_hold_days and current_risk < exception_thr:
                 in_conviction = True
-                
+
         # 3. Dynamic Thresholds
-        eff_exit = r_exit + (0.05 if regime == "BULL" else 0) + (0.05 if momentum > 0.15 else 0)
-        eff_reduce = r_reduce + (0.05 if regime == "BULL" else 0) + (0.05 if momentum > 0.15 else 0)
-        
+        eff_exit = r_exit + (0.05 if regime == 1 else 0.0) + (0.05 if mom > 0.15 else 0.0)
+        eff_reduce = r_reduce + (0.05 if regime == 1 else 0.0) + (0.05 if mom > 0.15 else 0.0)
+
         # 4. Signal Logic
         if in_conviction:
-            pos = 1.0 # Hold 100% of target
+            pos = 1.0  # Hold 100% of target
         elif current_risk > eff_exit:
-            pos = 0.3 # EXIT to moonbag/min
-            last_buy_date = None # Reset conviction
+            pos = 0.3  # EXIT to moonbag/min
+            has_buy = False  # Reset conviction
         elif current_risk > eff_reduce:
-            # 5. Multi-timeframe confirmation (scan back for spikes)
-            if i >= RULES["confirmation_days"]:
-                avg_recent = df[risk_col].iloc[i-RULES["confirmation_days"]:i].mean()
-                if current_risk > avg_recent + RULES["spike_tolerance"]:
-                    pos = positions[-1] if positions else 1.0 # Wait
+            # 5. Multi-timeframe confirmation (mean of the previous conf_days bars)
+            if i >= conf_days:
+                avg_recent = conf_sum / conf_days
+                if current_risk > avg_recent + spike_tol:
+                    pos = prev_pos  # Wait
                 else:
                     # 6. Dynamic Moonbag
-                    m_pct = mbag_base * (1.2 if regime == "BULL" else 0.8 if regime == "BEAR" else 1.0)
-                    if momentum > 0.20: m_pct += min(momentum * RULES["momentum_bonus"], 0.30)
-                    pos = min(m_pct, RULES["max_moonbag"])
+                    m_pct = mbag_base * (1.2 if regime == 1 else 0.8 if regime == 2 else 1.0)
+                    if mom > 0.20: m_pct += min(mom * mom_bonus, 0.30)
+                    pos = min(m_pct, max_mbag)
             else:
                 pos = 1.0
         elif current_risk < 0.30:
             pos = 1.0
-            if last_buy_date is None: last_buy_date = current_date
+            if not has_buy:
+                has_buy = True
+                last_buy_ns = t_ns[i]
         else:
-            pos = positions[-1] if positions else 1.0
-            
-        positions.append(pos)
-        
-    df['position'] = positions
-    df['trade'] = df['position'].diff().abs().fillna(0)
-    df['fees'] = df['trade'] * fee
-    df['raw_ret'] = df['Close'].pct_change()
-    df['strat_ret'] = (df['position'].shift(1) * df['raw_ret']) - df['fees']
+            pos = prev_pos
+
+        positions[i] = pos
+        prev_pos = pos
+
+        # Slide both trailing windows forward to end at bar i
+        regime_sum += current_risk
+        if i >= regime_lookback:
+            regime_sum -= risk[i - regime_lookback]
+        conf_sum += current_risk
+        if i >= conf_days:
+            conf_sum -= risk[i - conf_days]
+    return positions
+
+def run_backtest_v3_core(df, r_exit, r_reduce, mbag_base, rules=RULES, years=5,
+                         initial_capital=10000, fee=0.001, freq=365):
+    """
+    v3 Backtest on an already-analyzed history with the ticker's bands unpacked.
+    Sweeps over RULES call this directly so the config lookup and history load
+    happen once per ticker rather than once per parameter set.
+    """
+    start_date = pd.Timestamp.now() - pd.DateOffset(years=years)
+    df = df.loc[start_date:]
+    if len(df) < 150: return None
+    df = df.copy()  # only pay for the copy once the window is long enough
     
-    df['bh_value'] = initial_capital * (1 + df['raw_ret']).cumprod()
-    df['strat_value'] = initial_capital * (1 + df['strat_ret']).cumprod()
+    # Simulation (compiled state machine over raw arrays; momentum_30 comes precomputed from analyze_asset)
+    df['position'] = _simulate(
+        df['risk_total'].to_numpy(dtype=np.float64),
+        df['momentum_30'].to_numpy(dtype=np.float64),
+        df.index.to_numpy(dtype='datetime64[ns]').view(np.int64),
+        r_exit, r_reduce, mbag_base,
+        rules["regime_lookback"], rules["bull_threshold"], rules["bear_threshold"],
+        rules["min_hold_days"], rules["exception_threshold"],
+        rules["confirmation_days"], rules["spike_tolerance"],
+        rules["momentum_bonus"], rules["max_moonbag"])
+    trade, raw_ret, strat_ret, bh_value, strat_value = equity_curve(
+        df['Close'].to_numpy(dtype=np.float64), df['position'].to_numpy(dtype=np.float64),
+        fee, float(initial_capital))
+    df['trade'] = trade
+    df['fees'] = trade * fee
+    df['raw_ret'] = raw_ret
+    df['strat_ret'] = strat_ret
+    df['bh_value'] = bh_value
+    df['strat_value'] = strat_value
     
-    metrics = calculate_metrics(df, initial_capital)
+    return calculate_metrics(df, initial_capital, freq)
+
+def run_backtest_v3(ticker, years=5, initial_capital=10000, fee=0.001, data=None):
+    """v3 Backtest: Iterative state-based simulation (`data`: optional pre-downloaded OHLCV)"""
+    df = _load_history(ticker) if data is None else cached_analyze_asset(ticker, data)[0]
+
+    # Config (unknown tickers fall through to the default row at -1)
+    base_w, min_w, max_w, r_exit, r_reduce, mbag_base = CONFIG_ARR[TICKER_IDX.get(ticker, -1)]
+    # ASX listings trade ~252 days a year, everything else here is treated as 24/7
+    freq = 252 if ticker.endswith('.AX') else 365
+
+    metrics = run_backtest_v3_core(df, r_exit, r_reduce, mbag_base, RULES, years,
+                                   initial_capital, fee, freq)
+    if metrics is None: return None
     metrics['ticker'] = ticker
     return metrics
 
-def evaluate_v3():
-    """Stress test v3 and rank it."""
-    test_suite = ["BTC-USD", "ETH-USD", "GC=F", "BHP.AX", "FANG.AX"]
-    results = []
+def sweep_v3(ticker, grid, years=5, initial_capital=10000, fee=0.001):
+    """
+    Run the v3 backtest for every combination in `grid` (RULES key -> list of values),
+    loading the history and unpacking the ticker's bands once. Returns one row per
+    combination with the swept values alongside the metrics.
+    """
+    df = _load_history(ticker)
+    base_w, min_w, max_w, r_exit, r_reduce, mbag_base = CONFIG_ARR[TICKER_IDX.get(ticker, -1)]
+    freq = 252 if ticker.endswith('.AX') else 365
+
+    keys = list(grid)
+    rows = []
+    for values in product(*(grid[k] for k in keys)):
+        params = dict(zip(keys, values))
+        metrics = run_backtest_v3_core(df, r_exit, r_reduce, mbag_base, {**RULES, **params},
+                                       years, initial_capital, fee, freq)
+        if metrics: rows.append({**params, **metrics})
+    return pd.DataFrame(rows)
+
+STRESS_SUITE = ("BTC-USD", "ETH-USD", "GC=F", "BHP.AX", "FANG.AX")
+
+def evaluate_v3(test_suite=STRESS_SUITE):
+    """Stress test v3 and rank it (pass a longer ticker list for wider sweeps)."""
+    test_suite = list(test_suite)
     
     print("Starting Multi-Asset stress test (V3.0 REGIME-AWARE)...")
-    for t in test_suite:
-        m = run_backtest_v3(t)
-        if m: results.append(m)
+    # One batched download for whatever today's cache is missing
+    missing = uncached_tickers(test_suite)
+    prefetched = fetch_many(missing) if missing else {}
+    
+    # Tickers are independent, so run one backtest per process; they share the
+    # on-disk analysis cache rather than each re-downloading. Histories are
+    # popped as they're submitted so the parent ends up holding only metrics dicts.
+    with ProcessPoolExecutor(max_workers=min(len(test_suite), os.cpu_count() or 1)) as ex:
+        futures = [ex.submit(run_backtest_v3, t, data=prefetched.pop(t, None)) for t in test_suite]
+        results = [m for m in (f.result() for f in futures) if m]
         
     res_df = pd.DataFrame(results)
     
@@ -2,14 +2,15 @@
 import pandas as pd
 import sys
 from risk_analyzer import calculate_log_regression_risk as legacy_calc
-from enhanced_risk_analyzer import analyze_asset
+from enhanced_risk_analyzer import analyze_asset, fetch_many
 
-def compare_ticker(ticker):
+def compare_ticker(ticker, data=None):
+    """Score one ticker with both systems; `data` is an optional pre-downloaded OHLCV history."""
     print(f"\n--- Comparing Systems for {ticker} ---")
     
     # Run New System
     try:
-        new_df, _, new_meta = analyze_asset(ticker)
+        new_df, _, new_meta = analyze_asset(ticker, data)
         new_risk = new_meta.get('last_risk', 0)
     except Exception as e:
         print(f"New System Error: {e}")
@@ -17,12 +18,16 @@ def compare_ticker(ticker):
 
     # Run Legacy System
     try:
-        # Legacy fetch_data is inside risk_analyzer or we can reuse? 
-        # Actually risk_analyzer.fetch_data is same as imported one? 
-        # existing risk_analyzer imports yfinance directly.
-        # Let's import fetch_data from risk_analyzer to be safe.
-        from risk_analyzer import fetch_data as legacy_fetch
-        leg_data = legacy_fetch(ticker)
+        # Reuse the batched download when we have one (legacy only needs Close)
+        if data is not None:
+            leg_data = data[['Close']]
+        else:
+            # Legacy fetch_data is inside risk_analyzer or we can reuse? 
+            # Actually risk_analyzer.fetch_data is same as imported one? 
+            # existing risk_analyzer imports yfinance directly.
+            # Let's import fetch_data from risk_analyzer to be safe.
+            from risk_analyzer import fetch_data as legacy_fetch
+            leg_data = legacy_fetch(ticker)
         leg_df = legacy_calc(leg_data)
         leg_risk = leg_df['risk'].iloc[-1]
     except Exception as e:
@@ -43,6 +48,8 @@ if __name__ == "__main__":
     if len(sys.argv) > 1:
         compare_ticker(sys.argv[1])
     else:
-        # Default test
-        compare_ticker("BTC-USD")
-        compare_ticker("ETH-USD")
+        # Default test: one batched download feeds both systems for both tickers
+        defaults = ["BTC-USD", "ETH-USD"]
+        histories = fetch_many(defaults)
+        for t in defaults:
+            compare_ticker(t, histories.get(t))
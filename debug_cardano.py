@@ -15,7 +15,6 @@ def debug_final():
         
         # Exact logic from model_validation.py
         val_df = df.copy()
-        import pandas as pd
         val_df['fwd_return'] = val_df['Close'].shift(-30) / val_df['Close'] - 1
         val_df = val_df.dropna()
         
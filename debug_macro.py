@@ -12,6 +12,6 @@ if df.empty:
     import yfinance as yf
     tickers = ["BTC-USD", "^GSPC", "GC=F"]
     print("Raw yfinance download structure:")
-    data = yf.download(tickers, period="1y", progress=False, auto_adjust=True)
+    data = yf.download(tickers, period="1y", progress=False, auto_adjust=True, threads=True)
     print(data.columns)
     print(data.head())
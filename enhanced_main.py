@@ -1,15 +1,19 @@
 
 import os
+import json
 import time
+import argparse
+import random
+import hashlib
 import logging
+import asyncio
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed
 from datetime import datetime
-# from PIL import Image # For potential future image processing
-from openai import OpenAI
 from dotenv import load_dotenv
-import matplotlib.pyplot as plt
 import pandas as pd
+import numpy as np
 
-from enhanced_risk_analyzer import analyze_asset
+from enhanced_risk_analyzer import cached_analyze_asset, fetch_many, uncached_tickers, moving_average
 from model_validation import validate_model
 
 # Load Environment Variables
@@ -18,53 +22,82 @@ DEEPSEEK_API_KEY = os.getenv("DEEPSEEK_API_KEY")
 
 if DEEPSEEK_API_KEY:
     try:
-        client = OpenAI(api_key=DEEPSEEK_API_KEY, base_url="https://api.deepseek.com")
+        # openai is slow to import, so only pay for it when there is a key to use
+        import httpx
+        from openai import AsyncOpenAI, RateLimitError, APIConnectionError, InternalServerError
+        client = AsyncOpenAI(api_key=DEEPSEEK_API_KEY, base_url="https://api.deepseek.com")
+        # Worth another attempt (429s, timeouts/dropped connections, 5xx); anything else surfaces.
+        # httpx errors raised mid-stream are not wrapped by openai.
+        RETRYABLE_ERRORS = (RateLimitError, APIConnectionError, InternalServerError, httpx.TransportError)
     except:
         client = None
 else:
     client = None
 
-TICKERS = {
+# (name, ticker) pairs, in report order
+TICKERS = (
     # Crypto
-    "Bitcoin": "BTC-USD",
-    "Ethereum": "ETH-USD",
-    "Cardano": "ADA-USD",
+    ("Bitcoin", "BTC-USD"),
+    ("Ethereum", "ETH-USD"),
+    ("Cardano", "ADA-USD"),
     
     # Commodities
-    "Gold": "GC=F",
-    "Silver": "SI=F",
+    ("Gold", "GC=F"),
+    ("Silver", "SI=F"),
     
     # ASX - Miners / Resources
-    "BHP Group": "BHP.AX",
-    "Rio Tinto": "RIO.AX",
-    "Fortescue": "FMG.AX",
-    "Mineral Resources": "MIN.AX",
-    "Pilbara Minerals": "PLS.AX",
-    "South32": "S32.AX",
-    "IGO Ltd": "IGO.AX",
+    ("BHP Group", "BHP.AX"),
+    ("Rio Tinto", "RIO.AX"),
+    ("Fortescue", "FMG.AX"),
+    ("Mineral Resources", "MIN.AX"),
+    ("Pilbara Minerals", "PLS.AX"),
+    ("South32", "S32.AX"),
+    ("IGO Ltd", "IGO.AX"),
     
     # ASX - Financials / Other
-    "Macquarie Group": "MQG.AX",
-    "SiteMinder": "SDR.AX",
+    ("Macquarie Group", "MQG.AX"),
+    ("SiteMinder", "SDR.AX"),
     
     # ASX - ETFs
-    "Global X Semi": "SEMI.AX",
-    "Global X FANG+": "FANG.AX",
-    "BetaShares Mining Resources": "QRE.AX",
-    "Global X Robots": "RBTZ.AX",
-    "BetaShares Asia": "ASIA.AX",
-    "Vanguard Prop": "VAP.AX",
-    "BetaShares NDQ": "NDQ.AX"
-}
+    ("Global X Semi", "SEMI.AX"),
+    ("Global X FANG+", "FANG.AX"),
+    ("BetaShares Mining Resources", "QRE.AX"),
+    ("Global X Robots", "RBTZ.AX"),
+    ("BetaShares Asia", "ASIA.AX"),
+    ("Vanguard Prop", "VAP.AX"),
+    ("BetaShares NDQ", "NDQ.AX"),
+)
+
+# Tickers are processed concurrently (network-bound); AI calls are capped separately
+MAX_WORKERS = 8
+AI_MAX_CONCURRENCY = 10
+# Reply budget for one asset; the three-section answer can run past 500 tokens and get cut off
+AI_MAX_TOKENS = 1024
+# Uncached assets per DeepSeek request (~500 reply tokens each, inside AI_BATCH_MAX_TOKENS)
+AI_BATCH_SIZE = 6
+AI_BATCH_MAX_TOKENS = 4096
+# Seconds one request may spend across its retries before giving up
+AI_RETRY_BUDGET = 120
+
+# Assets read by the macro cycle dashboard
+CYCLE_TICKERS = ["BTC-USD", "ETH-USD", "GC=F", "SI=F"]
+
+# Histories from the batched prefetch, keyed by ticker (empty until main() fills it;
+# anything missing falls back to a per-ticker download)
+_PRICE_CACHE: dict[str, pd.DataFrame] = {}
+# analyze_asset results for this run, so the dashboard and the report share them
+_ASSET_CACHE: dict[str, tuple] = {}
 
 OUTPUT_DIR = "output"
 CHART_DIR = os.path.join(OUTPUT_DIR, "charts")
+# DeepSeek responses keyed by prompt hash; intraday reruns send identical prompts
+LLM_CACHE_DIR = os.path.join(OUTPUT_DIR, "cache", "llm")
+LLM_CACHE_TTL = 12 * 3600  # seconds
 LOG_DIR = "logs"
 
 def ensure_dirs():
-    if not os.path.exists(OUTPUT_DIR): os.makedirs(OUTPUT_DIR)
-    if not os.path.exists(CHART_DIR): os.makedirs(CHART_DIR)
-    if not os.path.exists(LOG_DIR): os.makedirs(LOG_DIR)
+    for d in (OUTPUT_DIR, CHART_DIR, LOG_DIR):
+        os.makedirs(d, exist_ok=True)
 
 def setup_logging():
     log_file = os.path.join(LOG_DIR, "institutional_analysis.log")
@@ -78,88 +111,272 @@ def setup_logging():
     )
     logging.info("Logging initialized.")
 
+# One validated asset's block in Section 1 of the report
+ASSET_SECTION = (
+    "\nASSET: {name} ({ticker})\n"
+    "Price: ${price:.2f}\n"
+    "RISK SCORE: {risk:.2f}  {signal}\n"
+    "Validation Score: {score}/100\n"
+    "Context: {context}\n"
+    "\nAI INSIGHT:\n"
+    "{ai_text}\n"
+    + "-"*50 + "\n"
+)
+
+# BUY / HOLD / SELL labels, indexed by signal_labels
+SIGNALS = np.array(["🟢 [BUY]", "🟡 [HOLD]", "🔴 [SELL]"])
+
+def exit_thresholds(tickers):
+    """v2.0 Asymmetric redlines per ticker: crypto 0.85, broad market 0.80, everything else 0.75."""
+    tickers = np.asarray(tickers, dtype=str)
+    has = lambda key: np.char.find(tickers, key) >= 0
+    return np.select([has("USD"), has("VGS") | has("MQG")], [0.85, 0.80], default=0.75)
+
+def signal_labels(tickers, risks):
+    """
+    Signal string per asset in one table lookup: below 0.30 is BUY, above the
+    asset's exit threshold is SELL, anything else (including NaN) is HOLD.
+    """
+    risks = np.asarray(risks, dtype=np.float64)
+    exits = exit_thresholds(tickers)
+    return SIGNALS[(~(risks < 0.30)).astype(int) + (risks > exits)]
+
+def context_lines(metas):
+    """
+    Report "Context:" line per asset meta, formatted column-wise. Missing/NaN
+    MA and current-drawdown fields are left out; an unknown max drawdown shows N/A.
+    """
+    if not metas:
+        return []
+    ctx = pd.DataFrame({
+        "ma50": [m.get("ma50_dist") for m in metas],
+        "ma200": [m.get("ma200_dist") for m in metas],
+        "dd_now": [m.get("drawdown_current") for m in metas],
+        "dd_max": [m.get("drawdown_max", 0) for m in metas],
+    }, dtype=float)
+    pct = (ctx * 100).apply(lambda col: col.map("{:.1f}%".format)).where(ctx.notna())
+    parts = pd.concat([
+        "MA50 dist: " + pct["ma50"],
+        "MA200 dist: " + pct["ma200"],
+        "Drawdown now: " + pct["dd_now"] + " (max " + pct["dd_max"].fillna("N/A") + ")",
+    ], axis=1).fillna("")
+    return ["; ".join(filter(None, row)) or "N/A" for row in parts.itertuples(index=False)]
+
+def analyze_cached(ticker):
+    """
+    analyze_asset once per ticker per run (callers treat the DataFrame as read-only),
+    backed by the same-day disk cache so reruns within a day skip the download too.
+    """
+    if ticker not in _ASSET_CACHE:
+        _ASSET_CACHE[ticker] = cached_analyze_asset(ticker, _PRICE_CACHE.get(ticker))
+    return _ASSET_CACHE[ticker]
+
+# The only columns the chart reads; workers get just these
+CHART_COLUMNS = ['Close', 'sma_200', 'risk_total', 'risk_valuation', 'rsi', 'risk_volatility']
+
+CHART_DPI = 80
+# zlib level 1: much faster PNG writes for slightly larger chart files
+PNG_SAVE_KWARGS = {"compress_level": 1}
+
+# Figure + 6 axes, built once per (worker) process and cleared between tickers
+_CHART_TEMPLATE = None
+
+def _chart_template():
+    global _CHART_TEMPLATE
+    if _CHART_TEMPLATE is None:
+        # Deferred: matplotlib is slow to import and only the chart path needs it.
+        # Figure (not pyplot) keeps no global state.
+        from matplotlib.figure import Figure
+        from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+        fig = Figure(figsize=(15, 12))
+        # Attach the Agg canvas once so savefig doesn't swap canvases on every PNG
+        FigureCanvasAgg(fig)
+        gs = fig.add_gridspec(3, 2)
+        axes = [fig.add_subplot(gs[r, c]) for r in range(3) for c in range(2)]
+        _CHART_TEMPLATE = (fig, axes)
+    return _CHART_TEMPLATE
+
+def _mark_unavailable(ax):
+    # Empty factor panel instead of plotting a flat placeholder series
+    ax.text(0.5, 0.5, "Not available", ha='center', va='center', transform=ax.transAxes)
+    ax.axis('off')
+
 def plot_comprehensive_analysis(ticker_name, ticker_symbol, df):
     """
     6-Panel Institutional Chart
+    Top-level and pyplot-free so it can run in a worker process; each process
+    reuses one figure, so calls within a process must not overlap.
     """
-    fig = plt.figure(figsize=(15, 12))
-    gs = fig.add_gridspec(3, 2)
+    fig, axes = _chart_template()
+    for ax in axes:
+        ax.clear()
+        ax.set_axis_on()
+    ax1, ax2, ax3, ax4, ax5, ax6 = axes
+
+    # Plain ndarrays once up front (index is tz-naive, so datetime64), instead of
+    # matplotlib converting the DatetimeIndex/Series on every call
+    idx = df.index.to_numpy()
+    close = df['Close'].to_numpy()
     
     # 1. Price + Regression Bands (Top Left)
-    ax1 = fig.add_subplot(gs[0, 0])
     ax1.set_title(f"{ticker_name} - Price & Fair Value Models")
-    ax1.plot(df.index, df['Close'], label='Price', color='black', lw=1)
+    ax1.plot(idx, close, label='Price', color='black', lw=1)
     
     # Needs debug info for bands? 
     # enhanced_risk_analyzer returns just Risk Scores in main DF.
     # We might want to expose regression bands in the future.
     # For now, plot Simple Moving Averages as proxy for bands if not in DF?
     # Or purely use price.
-    ax1.plot(df.index, df['Close'].rolling(200).mean(), label='200 SMA', color='orange', ls='--')
+    # analyze_asset already carries the 200 SMA; only recompute for frames without it
+    sma_200 = df['sma_200'].to_numpy() if 'sma_200' in df else moving_average(close, 200)
+    ax1.plot(idx, sma_200, label='200 SMA', color='orange', ls='--')
     ax1.set_yscale('log')
     ax1.legend()
     ax1.grid(True, alpha=0.2)
     
     # 2. Composite Risk (Top Right)
-    ax2 = fig.add_subplot(gs[0, 1])
     ax2.set_title("Composite Risk Score (0-1)")
-    ax2.plot(df.index, df['risk_total'], color='blue', lw=1.5)
+    ax2.plot(idx, df['risk_total'].to_numpy(), color='blue', lw=1.5)
     ax2.axhline(0.7, color='red', ls='--', alpha=0.5)
     ax2.axhline(0.3, color='green', ls='--', alpha=0.5)
-    ax2.fill_between(df.index, 0.7, 1.0, color='red', alpha=0.1)
-    ax2.fill_between(df.index, 0.0, 0.3, color='green', alpha=0.1)
+    ax2.fill_between(idx, 0.7, 1.0, color='red', alpha=0.1)
+    ax2.fill_between(idx, 0.0, 0.3, color='green', alpha=0.1)
     ax2.grid(True, alpha=0.2)
     
     # 3. Valuation Risk (Mid Left)
-    ax3 = fig.add_subplot(gs[1, 0])
     ax3.set_title("Factor: Valuation Risk")
-    ax3.plot(df.index, df.get('risk_valuation', df['risk_total']), color='purple', lw=1)
-    ax3.grid(True, alpha=0.2)
+    if 'risk_valuation' in df:
+        ax3.plot(idx, df['risk_valuation'].to_numpy(), color='purple', lw=1)
+        ax3.grid(True, alpha=0.2)
+    else:
+        _mark_unavailable(ax3)
     
     # 4. Momentum Risk/RSI (Mid Right)
-    ax4 = fig.add_subplot(gs[1, 1])
     ax4.set_title("Factor: Momentum (RSI)")
-    ax4.plot(df.index, df.get('rsi', [50]*len(df)), color='orange', lw=1)
-    ax4.axhline(70, color='red', ls=':')
-    ax4.axhline(30, color='green', ls=':')
-    ax4.grid(True, alpha=0.2)
+    if 'rsi' in df:
+        ax4.plot(idx, df['rsi'].to_numpy(), color='orange', lw=1)
+        ax4.axhline(70, color='red', ls=':')
+        ax4.axhline(30, color='green', ls=':')
+        ax4.grid(True, alpha=0.2)
+    else:
+        _mark_unavailable(ax4)
     
     # 5. Volatility Risk (Bot Left)
-    ax5 = fig.add_subplot(gs[2, 0])
     ax5.set_title("Factor: Volatility Risk")
-    ax5.plot(df.index, df.get('risk_volatility', [0.5]*len(df)), color='gray', lw=1)
-    ax5.grid(True, alpha=0.2)
+    if 'risk_volatility' in df:
+        ax5.plot(idx, df['risk_volatility'].to_numpy(), color='gray', lw=1)
+        ax5.grid(True, alpha=0.2)
+    else:
+        _mark_unavailable(ax5)
     
     # 6. Returns Distribution? Or Validation?
     # Let's show Recent 1-Year Performance vs Risk
-    ax6 = fig.add_subplot(gs[2, 1])
     ax6.text(0.1, 0.5, "Detailed Validation Metrics\nSee Report", fontsize=12)
     ax6.axis('off')
 
-    plt.tight_layout()
+    fig.tight_layout()
     path = os.path.join(CHART_DIR, f"{ticker_symbol}_comprehensive.png")
     try:
-        plt.savefig(path)
+        fig.savefig(path, dpi=CHART_DPI, pil_kwargs=PNG_SAVE_KWARGS)
     except Exception as e:
         logging.error(f"Error generating chart for {ticker_name}: {e}")
-    plt.close()
     return path
 
-def generate_ai_analysis(ticker, price, risk, metrics, meta):
-    if not client:
-        return "AI Analysis not available (No API Key)"
+def _llm_cache_get(prompt_hash):
+    path = os.path.join(LLM_CACHE_DIR, f"{prompt_hash}.txt")
+    try:
+        if time.time() - os.path.getmtime(path) < LLM_CACHE_TTL:
+            with open(path, encoding="utf-8") as f:
+                return f.read()
+    except OSError:
+        pass
+    return None
 
-    def fmt_pct(val):
-        return "N/A" if val is None or pd.isna(val) else f"{val*100:.1f}%"
-        
+def _llm_cache_prune():
+    # Entries past the TTL are never read again; drop them so the cache stays bounded
+    cutoff = time.time() - LLM_CACHE_TTL
+    try:
+        with os.scandir(LLM_CACHE_DIR) as entries:
+            for entry in entries:
+                if entry.name.endswith(".txt") and entry.stat().st_mtime < cutoff:
+                    os.remove(entry.path)
+    except OSError:
+        pass
+
+def _llm_cache_put(prompt_hash, response):
+    try:
+        os.makedirs(LLM_CACHE_DIR, exist_ok=True)
+        with open(os.path.join(LLM_CACHE_DIR, f"{prompt_hash}.txt"), "w", encoding="utf-8") as f:
+            f.write(response)
+    except OSError as e:
+        logging.warning(f"LLM cache write failed: {e}")
+
+def _fmt_pct(val):
+    # val != val is the NaN test for a scalar float, without pd.isna's dtype dispatch
+    return "N/A" if val is None or val != val else f"{val*100:.1f}%"
+
+# Shared by the single-asset and batched prompts; the single-asset text must stay
+# byte-identical so its cache keys don't change
+AI_RULES = """    Interpretation Rules (v2.0 Asymmetric):
+    - Value Zone (< 0.30): Institutional Accumulation (Buy).
+    - Danger Zone: Redlines vary by asset:
+        - Crypto (BTC/ETH): > 0.85
+        - Broad Market (VGS/MQG): > 0.80
+        - Satellite/Miners: > 0.75
+    - If risk is below Danger Zone but high, reduce to Moonbag.
+"""
+
+async def _deepseek_chat(label, prompt, slots, **params):
+    """
+    One completion, retried on transient errors; None once every attempt has failed
+    or the next backoff would overrun AI_RETRY_BUDGET.
+    """
+    max_retries = 5
+    deadline = time.monotonic() + AI_RETRY_BUDGET
+    for attempt in range(max_retries):
+        try:
+            # logging.info(f"AI Request for {label} (Attempt {attempt+1}/{max_retries})...")
+            print(f"  > AI Request for {label} (Attempt {attempt+1}/{max_retries})...")
+            
+            # Streamed: chunks keep the connection active, so long replies don't hit
+            # gateway timeouts, and `timeout` bounds the gap between chunks
+            async with slots:
+                stream = await client.chat.completions.create(
+                    model="deepseek-chat",
+                    messages=[{"role": "user", "content": prompt}],
+                    stream=True,
+                    **params
+                )
+                parts, finish_reason = [], None
+                async for chunk in stream:
+                    if not chunk.choices:
+                        continue
+                    parts.append(chunk.choices[0].delta.content or "")
+                    finish_reason = chunk.choices[0].finish_reason or finish_reason
+            if finish_reason == "length":
+                logging.warning(f"AI reply for {label} hit max_tokens and is truncated")
+            return "".join(parts).strip()
+            
+        except RETRYABLE_ERRORS as e:
+            # logging.warning(f"AI Failure {label}: {e}")
+            print(f"  > AI Error ({label}): {e}. Retrying...")
+            delay = min(2 ** attempt, 16) + random.random()  # Exponential backoff with jitter, capped
+            if attempt == max_retries - 1 or time.monotonic() + delay > deadline:
+                break
+            await asyncio.sleep(delay)
+    return None
+
+def build_ai_prompt(ticker, price, risk, metrics, meta):
+    """Institutional assessment prompt for one asset (also the LLM cache key)."""
     ret = meta.get("ret", {})
-    ma50 = fmt_pct(meta.get("ma50_dist"))
-    ma200 = fmt_pct(meta.get("ma200_dist"))
-    dd_cur = fmt_pct(meta.get("drawdown_current"))
-    dd_max = fmt_pct(meta.get("drawdown_max"))
-    ret_30 = fmt_pct(ret.get("ret_30d"))
-    ret_90 = fmt_pct(ret.get("ret_90d"))
-    ret_365 = fmt_pct(ret.get("ret_365d"))
+    ma50 = _fmt_pct(meta.get("ma50_dist"))
+    ma200 = _fmt_pct(meta.get("ma200_dist"))
+    dd_cur = _fmt_pct(meta.get("drawdown_current"))
+    dd_max = _fmt_pct(meta.get("drawdown_max"))
+    ret_30 = _fmt_pct(ret.get("ret_30d"))
+    ret_90 = _fmt_pct(ret.get("ret_90d"))
+    ret_365 = _fmt_pct(ret.get("ret_365d"))
         
     # Optimized Prompt
     prompt = f"""
@@ -167,14 +384,7 @@ def generate_ai_analysis(ticker, price, risk, metrics, meta):
     Current Price: ${price:.2f}
     Composite Risk Score: {risk:.2f} (0.0 = Buy/Value, 1.0 = Sell/Bubble)
     
-    Interpretation Rules (v2.0 Asymmetric):
-    - Value Zone (< 0.30): Institutional Accumulation (Buy).
-    - Danger Zone: Redlines vary by asset:
-        - Crypto (BTC/ETH): > 0.85
-        - Broad Market (VGS/MQG): > 0.80
-        - Satellite/Miners: > 0.75
-    - If risk is below Danger Zone but high, reduce to Moonbag.
-    
+{AI_RULES}    
     Context:
     - Performance: 30d {ret_30}, 90d {ret_90}, 365d {ret_365}
     - Trend: Distance to 50D MA {ma50}, 200D MA {ma200}
@@ -188,41 +398,106 @@ def generate_ai_analysis(ticker, price, risk, metrics, meta):
 
     Ensure the response is complete, objective, and does not cut off.
     """
+    return prompt
+
+
+async def generate_ai_analysis(ticker, price, risk, metrics, meta, slots, use_cache=True):
+    """
+    `slots` is an asyncio.Semaphore bounding how many requests are in flight.
+    use_cache=False ignores cached responses (the fresh one is still stored).
+    """
+    if not client:
+        return "AI Analysis not available (No API Key)"
+
+    prompt = build_ai_prompt(ticker, price, risk, metrics, meta)
+
+    # Price and risk are rounded to 2dp in the prompt, so unchanged inputs hash the same
+    prompt_hash = hashlib.sha256(prompt.encode()).hexdigest()
+    cached = _llm_cache_get(prompt_hash) if use_cache else None
+    if cached is not None:
+        return cached
     
-    max_retries = 3
-    for attempt in range(max_retries):
-        try:
-            # logging.info(f"AI Request for {ticker} (Attempt {attempt+1}/{max_retries})...")
-            print(f"  > AI Request for {ticker} (Attempt {attempt+1}/{max_retries})...")
-            
-            response = client.chat.completions.create(
-                model="deepseek-chat",
-                messages=[{"role": "user", "content": prompt}],
-                max_tokens=500,
-                timeout=30
-            )
-            return response.choices[0].message.content.strip()
-            
-        except Exception as e:
-            # logging.warning(f"AI Failure {ticker}: {e}")
-            print(f"  > AI Error ({ticker}): {e}. Retrying...")
-            time.sleep(2 * (attempt + 1)) # Backoff
-            
-    return "AI Analysis Failed after retries."
+    text = await _deepseek_chat(ticker, prompt, slots, max_tokens=AI_MAX_TOKENS, timeout=90)
+    if text is None:
+        return "AI Analysis Failed after retries."
+    _llm_cache_put(prompt_hash, text)
+    return text
+
+def build_batch_prompt(assets):
+    """Assessment prompt for several report assets; the reply is a JSON object keyed by ticker."""
+    lines = []
+    for a in assets:
+        meta = a['meta']
+        ret = meta.get("ret", {})
+        lines.append(
+            f"    - {a['ticker']} ({a['name']}): Price ${meta['last_price']:.2f} | Risk {meta['last_risk']:.2f} | "
+            f"Performance 30d {_fmt_pct(ret.get('ret_30d'))}, 90d {_fmt_pct(ret.get('ret_90d'))}, "
+            f"365d {_fmt_pct(ret.get('ret_365d'))} | "
+            f"Distance to 50D MA {_fmt_pct(meta.get('ma50_dist'))}, 200D MA {_fmt_pct(meta.get('ma200_dist'))} | "
+            f"Drawdown Current {_fmt_pct(meta.get('drawdown_current'))}, Max {_fmt_pct(meta.get('drawdown_max'))} | "
+            f"Model Validation Score {a['val_metrics'].get('score', 0)}/100")
+    assets_block = "\n".join(lines)
+
+    return f"""
+    Provide a professional Institutional Risk Assessment for each asset below.
+    Composite Risk Score: 0.0 = Buy/Value, 1.0 = Sell/Bubble.
+
+{AI_RULES}
+    Assets:
+{assets_block}
+
+    Reply with a JSON object keyed by ticker. Each value is an object with three string fields:
+    - "action_bias": Institutional Action Bias (Must align with Interpretation Rules above)
+    - "risk_drivers": Key Risk Drivers; analysis of valuation, momentum, and volatility.
+    - "structural_context": Note if price is above/below key moving averages and the significance of the current drawdown.
+
+    Ensure every asset is covered and each field is complete and objective.
+    """
+
+AI_BATCH_FIELDS = (("action_bias", "Institutional Action Bias"),
+                   ("risk_drivers", "Key Risk Drivers"),
+                   ("structural_context", "Structural Context"))
+
+async def generate_ai_analysis_batch(assets, slots):
+    """
+    AI Insight for several assets from one request, formatted like the single-asset
+    reply. Returns {ticker: text} for the assets the reply covered (possibly none).
+    """
+    text = await _deepseek_chat(f"{len(assets)} assets", build_batch_prompt(assets), slots,
+                                max_tokens=AI_BATCH_MAX_TOKENS, timeout=120,
+                                response_format={"type": "json_object"})
+    if text is None:
+        return {}
+    try:
+        reply = json.loads(text)
+    except ValueError as e:
+        logging.warning(f"Unparseable batched AI reply: {e}")
+        return {}
+
+    texts = {}
+    for a in assets:
+        entry = reply.get(a['ticker']) if isinstance(reply, dict) else None
+        if isinstance(entry, dict) and all(entry.get(key) for key, _ in AI_BATCH_FIELDS):
+            texts[a['ticker']] = "\n".join(f"{i}. **{title}**: {str(entry[key]).strip()}"
+                                          for i, (key, title) in enumerate(AI_BATCH_FIELDS, 1))
+    return texts
 
 def analyze_market_cycle():
     """
     Context-only macro snapshot (non-blocking).
     """
     print("Analyzing Capital Cascade Model...")
-    from enhanced_risk_analyzer import analyze_asset
     
-    cycle_report = "RISK-BUBBLE ANALYSIS: CAPITAL CASCADE DASHBOARD (CONTEXT ONLY)\n" + "="*50 + "\n"
+    parts = ["RISK-BUBBLE ANALYSIS: CAPITAL CASCADE DASHBOARD (CONTEXT ONLY)\n", "="*50 + "\n"]
     
     try:
+        # Standalone callers (the adaptive portfolios) skip main's prefetch; batch the
+        # dashboard downloads here instead of four sequential ones (no-op after main's)
+        prefetch_prices(CYCLE_TICKERS)
+
         def safe_asset(t):
             try:
-                df, _, meta = analyze_asset(t)
+                df, _, meta = analyze_cached(t)
                 if meta.get("reason") or df.empty:
                     return pd.DataFrame(), {"last_price": 0, "last_risk": 0}
                 return df, meta
@@ -235,35 +510,33 @@ def analyze_market_cycle():
         gold_df, gold_meta = safe_asset("GC=F")
         silver_df, silver_meta = safe_asset("SI=F")
 
-        def get_signal(ticker_symbol, r):
-            # Asymmetric Logic
-            exit_t = 0.85 if "USD" in ticker_symbol else 0.80 if "VGS" in ticker_symbol or "MQG" in ticker_symbol else 0.75
-            buy_t = 0.30
-            
-            if r < buy_t: return "🟢 [BUY]"
-            if r > exit_t: return "🔴 [SELL]"
-            return "🟡 [HOLD]"
-
-        # Ratios for color
-        gsr = gold_meta['last_price'] / silver_meta['last_price'] if silver_meta['last_price'] else 0
-        eth_btc = eth_meta['last_price'] / btc_meta['last_price'] if btc_meta['last_price'] else 0
-
-        cycle_report += "ASSET STATUS (CONTEXT):\n"
-        cycle_report += f"- BTC:    ${btc_meta['last_price']:.0f} | Risk: {round(btc_meta['last_risk'],2):.2f} {get_signal('BTC-USD', round(btc_meta['last_risk'],2))}\n"
-        cycle_report += f"- ETH:    ${eth_meta['last_price']:.0f} | Risk: {round(eth_meta['last_risk'],2):.2f} {get_signal('ETH-USD', round(eth_meta['last_risk'],2))}\n"
-        cycle_report += f"- GOLD:   ${gold_meta['last_price']:.1f} | Risk: {round(gold_meta['last_risk'],2):.2f} {get_signal('GC=F', round(gold_meta['last_risk'],2))}\n"
-        cycle_report += f"- SILVER: ${silver_meta['last_price']:.1f} | Risk: {round(silver_meta['last_risk'],2):.2f} {get_signal('SI=F', round(silver_meta['last_risk'],2))}\n\n"
-        
-        cycle_report += "KEY METRICS (COLOR ONLY):\n"
-        cycle_report += f"- Gold/Silver Ratio: {gsr:.2f}\n"
-        cycle_report += f"- ETH/BTC Ratio:     {eth_btc:.4f}\n"
+        # (label, ticker, meta, price format) per dashboard row; signals for all rows at once
+        rows = [("BTC:   ", "BTC-USD", btc_meta, ".0f"), ("ETH:   ", "ETH-USD", eth_meta, ".0f"),
+                ("GOLD:  ", "GC=F", gold_meta, ".1f"), ("SILVER:", "SI=F", silver_meta, ".1f")]
+
+        # Ratios for color: (numerator, denominator) row indices, 0 where the denominator is missing
+        prices = np.array([meta['last_price'] for _, _, meta, _ in rows], dtype=float)
+        num, den = prices[[2, 1]], prices[[3, 0]]
+        gsr, eth_btc = np.divide(num, den, out=np.zeros_like(num), where=den != 0).tolist()
+
+        risks = [round(meta['last_risk'], 2) for _, _, meta, _ in rows]
+        signals = signal_labels([t for _, t, _, _ in rows], risks)
+
+        lines = ["ASSET STATUS (CONTEXT):"]
+        lines += [f"- {label} ${meta['last_price']:{fmt}} | Risk: {r:.2f} {sig}"
+                  for (label, _, meta, fmt), r, sig in zip(rows, risks, signals)]
+        lines += ["", "KEY METRICS (COLOR ONLY):",
+                  f"- Gold/Silver Ratio: {gsr:.2f}",
+                  f"- ETH/BTC Ratio:     {eth_btc:.4f}"]
+        parts.append("\n".join(lines) + "\n")
 
     except Exception as e:
-        cycle_report += f"Error calculating cycle metrics: {e}\n"
+        parts.append(f"Error calculating cycle metrics: {e}\n")
         import traceback
         traceback.print_exc()
     
-    cycle_report += "="*50 + "\n\n"
+    parts.append("="*50 + "\n\n")
+    cycle_report = "".join(parts)
     
     context = {
         "gsr": locals().get('gsr', 0),
@@ -271,7 +544,127 @@ def analyze_market_cycle():
     }
     return cycle_report, context
 
-def main():
+def process_ticker(name, ticker):
+    """
+    Analyze and validate one asset (charts and AI insight are added later in batches).
+    Returns (is_valid, asset_data), or None if processing crashed.
+    """
+    print(f"Analyzing {name} ({ticker})...")
+    try:
+        df, _, meta = analyze_cached(ticker)
+        if meta.get("reason"):
+            return False, {
+                "name": name,
+                "ticker": ticker,
+                "reason": meta["reason"]
+            }
+        if df.empty:
+            return False, {
+                "name": name,
+                "ticker": ticker,
+                "reason": "No data returned"
+            }
+        
+        # Run Validation
+        val_metrics = validate_model(df)
+        score = val_metrics.get('score', 0)
+        if val_metrics.get("error"):
+            return False, {
+                "name": name,
+                "ticker": ticker,
+                "reason": val_metrics["error"]
+            }
+        
+        # --- INSTITUTIONAL HARD GATE ---
+        # Score < 60: FAIL. NO SIGNAL.
+        # Score >= 60: PASS. Actionable.
+        
+        is_valid = score >= 60
+
+        # Common Data
+        asset_data = {
+            "name": name,
+            "ticker": ticker,
+            "price": round(meta['last_price'], 2),
+            "risk": round(meta['last_risk'], 2),
+            "score": score,
+            "meta": meta,
+            "val_metrics": val_metrics
+        }
+        
+        if not is_valid:
+            asset_data["reason"] = "Validation Failure (<60)"
+        return is_valid, asset_data
+        
+    except Exception as e:
+        print(f"Error {name}: {e}")
+        import traceback
+        traceback.print_exc()
+        return None
+
+def prefetch_prices(tickers):
+    """One batched download for the tickers not yet analyzed this run, held in memory or cached today."""
+    tickers = [t for t in dict.fromkeys(tickers) if t not in _ASSET_CACHE and t not in _PRICE_CACHE]
+    tickers = uncached_tickers(tickers)
+    if not tickers: return
+    try:
+        _PRICE_CACHE.update(fetch_many(tickers))
+    except Exception as e:
+        logging.warning(f"Batched prefetch failed, falling back to per-ticker downloads: {e}")
+
+def prefetch_all_prices():
+    """Prefetch every ticker the run analyzes (dashboard + report)."""
+    prefetch_prices(CYCLE_TICKERS + [t for _, t in TICKERS])
+
+async def annotate_with_ai(assets, use_cache=True):
+    """
+    Generate AI Insight for every asset, at most AI_MAX_CONCURRENCY requests at a time.
+    Uncached assets are sent AI_BATCH_SIZE per request; any a batch reply misses get
+    their own request.
+    """
+    if not client:
+        for asset in assets:
+            asset["ai_text"] = "AI Analysis not available (No API Key)"
+        return
+
+    _llm_cache_prune()
+    slots = asyncio.Semaphore(AI_MAX_CONCURRENCY)
+    args = {a['ticker']: (a['name'], a['meta']['last_price'], a['meta']['last_risk'], a['val_metrics'], a['meta'])
+            for a in assets}
+
+    # Batched replies are cached under the single-asset prompt hash, so both paths share entries
+    hashes, pending = {}, []
+    for asset in assets:
+        prompt_hash = hashlib.sha256(build_ai_prompt(*args[asset['ticker']]).encode()).hexdigest()
+        cached = _llm_cache_get(prompt_hash) if use_cache else None
+        if cached is not None:
+            asset["ai_text"] = cached
+        else:
+            hashes[asset['ticker']] = prompt_hash
+            pending.append(asset)
+
+    batches = [pending[i:i + AI_BATCH_SIZE] for i in range(0, len(pending), AI_BATCH_SIZE)]
+    replies = await asyncio.gather(*(generate_ai_analysis_batch(b, slots) for b in batches),
+                                   return_exceptions=True)
+    leftover = []
+    for batch, reply in zip(batches, replies):
+        if isinstance(reply, Exception):
+            logging.warning(f"Batched AI request failed: {reply}")
+            reply = {}
+        for asset in batch:
+            text = reply.get(asset['ticker'])
+            if text is None:
+                leftover.append(asset)
+            else:
+                asset["ai_text"] = text
+                _llm_cache_put(hashes[asset['ticker']], text)
+
+    texts = await asyncio.gather(*(generate_ai_analysis(*args[a['ticker']], slots, use_cache=False)
+                                   for a in leftover), return_exceptions=True)
+    for asset, text in zip(leftover, texts):
+        asset["ai_text"] = f"AI Analysis Failed: {text}" if isinstance(text, Exception) else text
+
+def main(use_llm_cache=True, plot_charts=True):
     ensure_dirs()
     setup_logging()
     print("Starting Institutional Analysis Run...")
@@ -279,6 +672,8 @@ def main():
     
     report_path = os.path.join(OUTPUT_DIR, "institutional_analysis_report.txt")
     
+    prefetch_all_prices()
+    
     # --- MACRO CYCLE (Context Only) ---
     try:
         cycle_text, macro_context = analyze_market_cycle()
@@ -299,132 +694,71 @@ def main():
     
     print("\n--- Processing Assets ---")
     
-    for name, ticker in TICKERS.items():
-        print(f"Analyzing {name} ({ticker})...")
-        try:
-            df, _, meta = analyze_asset(ticker)
-            if meta.get("reason"):
-                invalid_assets.append({
-                    "name": name,
-                    "ticker": ticker,
-                    "reason": meta["reason"]
-                })
-                continue
-            if df.empty:
-                invalid_assets.append({
-                    "name": name,
-                    "ticker": ticker,
-                    "reason": "No data returned"
-                })
-                continue
-            
-            # Run Validation
-            val_metrics = validate_model(df)
-            score = val_metrics.get('score', 0)
-            if val_metrics.get("error"):
-                invalid_assets.append({
-                    "name": name,
-                    "ticker": ticker,
-                    "reason": val_metrics["error"]
-                })
-                continue
-            
-            # --- INSTITUTIONAL HARD GATE ---
-            # Score < 60: FAIL. NO SIGNAL.
-            # Score >= 60: PASS. Actionable.
-            
-            is_valid = score >= 60
+    # map() yields in TICKERS order, so the report keeps its layout
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as ex:
+        for outcome in ex.map(process_ticker, *zip(*TICKERS)):
+            if outcome is None: continue
+            is_valid, asset_data = outcome
+            (valid_assets if is_valid else invalid_assets).append(asset_data)
 
-            # Common Data
-            asset_data = {
-                "name": name,
-                "ticker": ticker,
-                "price": round(meta['last_price'], 2),
-                "risk": round(meta['last_risk'], 2),
-                "score": score,
-                "meta": meta,
-                "val_metrics": val_metrics
-            }
-            
-            plot_comprehensive_analysis(name, ticker, df)
-            
-            if is_valid:
-                # Generate AI Insight only for valid
-                asset_data["ai_text"] = generate_ai_analysis(name, meta['last_price'], meta['last_risk'], val_metrics, meta)
-                valid_assets.append(asset_data)
-            else:
-                asset_data["reason"] = "Validation Failure (<60)"
-                invalid_assets.append(asset_data)
-                
-            time.sleep(1) # Rate limit
-            
-        except Exception as e:
-            print(f"Error {name}: {e}")
-            import traceback
-            traceback.print_exc()
+    # Charts are CPU-bound, so render them in worker processes while the AI
+    # requests are in flight (assets that reached validation get a chart).
+    # With charts off nothing is submitted, so no worker (or matplotlib import) starts.
+    charted = [a for a in valid_assets + invalid_assets if "val_metrics" in a] if plot_charts else []
+    with ProcessPoolExecutor(max_workers=os.cpu_count()) as charts:
+        futures = {}
+        for a in charted:
+            df = _ASSET_CACHE[a['ticker']][0]
+            slim = df[[c for c in CHART_COLUMNS if c in df.columns]]
+            futures[charts.submit(plot_comprehensive_analysis, a['name'], a['ticker'], slim)] = a['name']
+
+        # Generate AI Insight only for valid
+        asyncio.run(annotate_with_ai(valid_assets, use_llm_cache))
+
+        for f in as_completed(futures):
+            try:
+                f.result()
+            except Exception as e:
+                logging.error(f"Error generating chart for {futures[f]}: {e}")
 
     # --- REPORT CONSTRUCTION ---
-    full_report = f"INSTITUTIONAL RISK REPORT - {datetime.now().strftime('%Y-%m-%d')}\n"
-    full_report += "="*60 + "\n\n"
-    
-    # 1. Macro Dashboard
-    full_report += cycle_text
+    # Streamed straight into one buffered file handle, section by section
+    # utf-8 explicitly: the signal labels are emoji, which the platform default may not encode
+    with open(report_path, "w", buffering=1 << 20, encoding="utf-8") as f:
+        f.write(f"INSTITUTIONAL RISK REPORT - {datetime.now().strftime('%Y-%m-%d')}\n")
+        f.write("="*60 + "\n\n")
     
-    # 2. VALIDATED SIGNALS
-    full_report += "SECTION 1: ACTIONABLE INSTITUTIONAL SIGNALS (Validation >= 60)\n"
-    full_report += "="*60 + "\n"
+        # 1. Macro Dashboard
+        f.write(cycle_text)
     
-    if not valid_assets:
-        full_report += "No assets passed strict validation criteria.\n"
+        # 2. VALIDATED SIGNALS
+        f.write("SECTION 1: ACTIONABLE INSTITUTIONAL SIGNALS (Validation >= 60)\n")
+        f.write("="*60 + "\n")
     
-    for asset in valid_assets:
-        r = asset['risk']
-        
-        # Signal Logic (v2.0 Asymmetric)
-        exit_t = 0.85 if "USD" in asset['ticker'] else 0.80 if "VGS" in asset['ticker'] or "MQG" in asset['ticker'] else 0.75
-        signal_str = "🟢 [BUY]" if r < 0.3 else "🔴 [SELL]" if r > exit_t else "🟡 [HOLD]"
-
-        meta = asset['meta']
-        ma_context = []
-        if meta.get("ma50_dist") is not None and not pd.isna(meta.get("ma50_dist")):
-            ma_context.append(f"MA50 dist: {meta['ma50_dist']*100:.1f}%")
-        if meta.get("ma200_dist") is not None and not pd.isna(meta.get("ma200_dist")):
-            ma_context.append(f"MA200 dist: {meta['ma200_dist']*100:.1f}%")
-        dd_context = []
-        if meta.get("drawdown_current") is not None and not pd.isna(meta.get("drawdown_current")):
-            max_dd_val = meta.get('drawdown_max', 0)
-            max_dd_text = f"{max_dd_val*100:.1f}%" if not pd.isna(max_dd_val) else "N/A"
-            dd_context.append(f"Drawdown now: {meta['drawdown_current']*100:.1f}% (max {max_dd_text})")
-        context_line = "; ".join(ma_context + dd_context) if (ma_context or dd_context) else "N/A"
-        section = f"""
-ASSET: {asset['name']} ({asset['ticker']})
-Price: ${asset['price']:.2f}
-RISK SCORE: {r:.2f}  {signal_str}
-Validation Score: {asset['score']}/100
-Context: {context_line}
-
-AI INSIGHT:
-{asset['ai_text']}
---------------------------------------------------
-"""
-        full_report += section
-
-    # 3. FAILED MODELS
-    full_report += "\nSECTION 2: MODEL FAILURE / NO SIGNAL\n"
-    full_report += "These assets were not actioned due to validation/history/volume gates.\n"
-    full_report += "="*60 + "\n"
-    full_report += f"{'ASSET':<20} | {'REASON'}\n"
-    full_report += "-"*60 + "\n"
+        if not valid_assets:
+            f.write("No assets passed strict validation criteria.\n")
     
-    for asset in invalid_assets:
-        reason = asset.get("reason", "Validation < 60")
-        full_report += f"{asset.get('name','N/A'):<20} | {reason}\n"
-        
-    # Save
-    with open(report_path, "w") as f:
-        f.write(full_report)
-        
+        # Signal Logic (v2.0 Asymmetric), labelled for all assets at once
+        signals = signal_labels([a['ticker'] for a in valid_assets], [a['risk'] for a in valid_assets])
+        contexts = context_lines([a['meta'] for a in valid_assets])
+        for asset, signal_str, context_line in zip(valid_assets, signals, contexts):
+            f.write(ASSET_SECTION.format_map({**asset, "signal": signal_str, "context": context_line}))
+
+        # 3. FAILED MODELS
+        f.write("\nSECTION 2: MODEL FAILURE / NO SIGNAL\n")
+        f.write("These assets were not actioned due to validation/history/volume gates.\n")
+        f.write("="*60 + "\n")
+        f.write(f"{'ASSET':<20} | {'REASON'}\n")
+        f.write("-"*60 + "\n")
+        # Rows rendered in one pass and written once
+        f.write("".join(f"{asset.get('name','N/A'):<20} | {asset.get('reason', 'Validation < 60')}\n"
+                        for asset in invalid_assets))
+
     print(f"\nDone. Report saved to {report_path}")
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Institutional Risk-Bubble Report")
+    parser.add_argument("--no-cache", action="store_true", help="Regenerate AI insights instead of reusing cached ones")
+    parser.add_argument("--no-plot", action="store_true", help="Skip chart rendering (text report only)")
+    args = parser.parse_args()
+    main(use_llm_cache=not args.no_cache, plot_charts=not args.no_plot)
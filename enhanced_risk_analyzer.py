@@ -1,54 +1,104 @@
+import os
+import json
+from datetime import date
 import yfinance as yf
 import pandas as pd
 import numpy as np
 from scipy.stats import linregress, norm
 
+CACHE_DIR = ".cache"
+
 def fetch_data(ticker: str, period: str = "max") -> pd.DataFrame:
     """
     Fetch adjusted OHLCV for a ticker. Prefers adjusted close to avoid split/div noise.
     """
     print(f"Fetching data for {ticker}...")
     try:
-        data = yf.download(ticker, period=period, progress=False, auto_adjust=True)
+        # Ticker.history keeps its state per instance, unlike yf.download's module-level
+        # result dict, so concurrent fetches from a thread pool don't clobber each other.
+        data = yf.Ticker(ticker).history(period=period, auto_adjust=True)
         if data.empty:
             raise ValueError(f"No data returned for {ticker}")
+        # Match yf.download's tz-naive daily index so date comparisons downstream keep working
+        if getattr(data.index, "tz", None) is not None:
+            data.index = data.index.tz_localize(None)
 
-        # Flatten MultiIndex from yfinance (Price|Ticker)
-        if isinstance(data.columns, pd.MultiIndex):
-            # If only one ticker, drop the ticker level
-            if len(set(data.columns.get_level_values(-1))) == 1:
-                data.columns = data.columns.get_level_values(0)
-            else:
-                data = data.droplevel(0, axis=1)
-
-        # Normalize column names
-        cols = {str(c).lower(): c for c in data.columns}
-        rename = {}
-        close_key = 'close' if 'close' in cols else 'adj close' if 'adj close' in cols else None
-        if close_key:
-            rename[cols[close_key]] = 'Close'
-        for key in ['high', 'low', 'volume']:
-            if key in cols:
-                rename[cols[key]] = key.capitalize()
-        data = data.rename(columns=rename)
-
-        if 'Close' not in data.columns:
-            raise ValueError(f"Could not locate Close column in data. Columns found: {data.columns}")
-
-        # Ensure required fields exist; allow Volume to be missing (fallback handled later)
-        for required in ['High', 'Low']:
-            if required not in data.columns:
-                data[required] = data['Close']
-        if 'Volume' not in data.columns:
-            data['Volume'] = np.nan
-
-        data = data[['Close', 'High', 'Low', 'Volume']].dropna(subset=['Close'])
-        return data
+        return _normalize_ohlcv(data)
     except Exception as e:
         raise ValueError(f"Error fetching data for {ticker}: {e}")
 
+def _normalize_ohlcv(data: pd.DataFrame) -> pd.DataFrame:
+    """Coerce a raw yfinance frame to Close/High/Low/Volume columns."""
+    # Flatten MultiIndex from yfinance (Price|Ticker)
+    if isinstance(data.columns, pd.MultiIndex):
+        # If only one ticker, drop the ticker level
+        if len(set(data.columns.get_level_values(-1))) == 1:
+            data.columns = data.columns.get_level_values(0)
+        else:
+            data = data.droplevel(0, axis=1)
+
+    # Normalize column names
+    cols = {str(c).lower(): c for c in data.columns}
+    rename = {}
+    close_key = 'close' if 'close' in cols else 'adj close' if 'adj close' in cols else None
+    if close_key:
+        rename[cols[close_key]] = 'Close'
+    for key in ['high', 'low', 'volume']:
+        if key in cols:
+            rename[cols[key]] = key.capitalize()
+    data = data.rename(columns=rename)
+
+    if 'Close' not in data.columns:
+        raise ValueError(f"Could not locate Close column in data. Columns found: {data.columns}")
+
+    # Ensure required fields exist; allow Volume to be missing (fallback handled later)
+    for required in ['High', 'Low']:
+        if required not in data.columns:
+            data[required] = data['Close']
+    if 'Volume' not in data.columns:
+        data['Volume'] = np.nan
+
+    data = data[['Close', 'High', 'Low', 'Volume']].dropna(subset=['Close'])
+    return data
+
+def fetch_many(tickers: list[str], period: str = "max") -> dict[str, pd.DataFrame]:
+    """
+    Fetch adjusted OHLCV for several tickers in one batched download, normalized
+    like fetch_data. Tickers that come back empty are left out of the result.
+    """
+    print(f"Fetching data for {', '.join(tickers)}...")
+    raw = yf.download(list(tickers), period=period, group_by='ticker', threads=True,
+                      auto_adjust=True, progress=False)
+    histories = {}
+    for ticker in tickers:
+        try:
+            data = raw[ticker] if isinstance(raw.columns, pd.MultiIndex) else raw
+            data = _normalize_ohlcv(data.dropna(how='all'))
+        except Exception as e:
+            print(f"  Skipping {ticker}: {e}")
+            continue
+        if not data.empty:
+            histories[ticker] = data
+    return histories
+
 # --- Technical Indicators ---
 
+def moving_average(values: np.ndarray, window: int) -> np.ndarray:
+    """
+    Trailing simple moving average from one cumulative sum, NaN until the window
+    fills (same as Series.rolling(window).mean()). Gappy input takes the pandas path.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    if np.isnan(values).any():
+        return pd.Series(values).rolling(window).mean().to_numpy()
+    out = np.full(len(values), np.nan)
+    if len(values) >= window:
+        cs = np.empty(len(values) + 1)
+        cs[0] = 0.0
+        np.cumsum(values, out=cs[1:])
+        out[window-1:] = (cs[window:] - cs[:-window]) / window
+    return out
+
 def calculate_rsi(series: pd.Series, period: int = 14) -> pd.Series:
     # Wilder smoothing to reduce whipsaw
     delta = series.diff()
@@ -177,26 +227,24 @@ def calculate_valuation_risk(df: pd.DataFrame, min_periods: int = 200) -> tuple[
         linear_residuals[i] = resid_lin
         quad_residuals[i] = resid_quad
         
-        # Z-Scores based on historical residuals
-        # (Using minimal 200 period history for std dev to stabilize)
-        hist_lin = linear_residuals[min_periods:i+1]
-        hist_quad = quad_residuals[min_periods:i+1]
-        
-        std_lin = np.nanstd(hist_lin) if len(hist_lin) > 10 else 1.0
-        std_quad = np.nanstd(hist_quad) if len(hist_quad) > 10 else 1.0
-        
-        z_lin = resid_lin / std_lin if std_lin > 0 else 0
-        z_quad = resid_quad / std_quad if std_quad > 0 else 0
-        
-        # 3. Probabilities
-        prob_lin = norm.cdf(z_lin)
-        prob_quad = norm.cdf(z_quad)
-        
-        # Ensemble Weighting:
-        # If trend is accelerating (convex), quad fits better.
-        # Simple average is robust.
-        risk_ensemble[i] = (prob_lin * 0.4) + (prob_quad * 0.6) # Give more weight to curve
-        
+    # Z-Scores based on historical residuals, i.e. each residual over the std of all
+    # residuals up to it. The expanding std is built once for every i instead of
+    # re-scanning the history each step (1.0 until more than 10 residuals exist).
+    def _z_scores(resid: np.ndarray) -> np.ndarray:
+        resid = resid[min_periods:]
+        std = pd.Series(resid).expanding().std(ddof=0).to_numpy(copy=True)
+        std[:10] = 1.0
+        return np.divide(resid, std, out=np.zeros_like(resid), where=std > 0)
+
+    # 3. Probabilities
+    prob_lin = norm.cdf(_z_scores(linear_residuals))
+    prob_quad = norm.cdf(_z_scores(quad_residuals))
+    
+    # Ensemble Weighting:
+    # If trend is accelerating (convex), quad fits better.
+    # Simple average is robust.
+    risk_ensemble[min_periods:] = (prob_lin * 0.4) + (prob_quad * 0.6) # Give more weight to curve
+
     debug_df = pd.DataFrame({
         'log_price': log_price,
         'pred_linear': pred_linear,
@@ -208,14 +256,15 @@ def calculate_valuation_risk(df: pd.DataFrame, min_periods: int = 200) -> tuple[
     return pd.Series(risk_ensemble, index=df.index), debug_df
 
 
-def analyze_asset(ticker: str) -> tuple[pd.DataFrame, dict, dict]:
+def analyze_asset(ticker: str, data: pd.DataFrame | None = None) -> tuple[pd.DataFrame, dict, dict]:
     """
     Main entry point for single asset analysis.
+    Pass `data` (e.g. from fetch_many) to analyze an already-downloaded history.
     Returns: (DataFrame with all metrics, Validation Metrics Dict, Metadata Dict)
     """
     # 1. Fetch
     try:
-        df = fetch_data(ticker)
+        df = fetch_data(ticker) if data is None else data.copy()
     except Exception as e:
         # print(f"Error fetching {ticker}: {e}")
         return pd.DataFrame(), {}, {"ticker": ticker, "reason": f"Fetch Failure: {str(e)}"}
@@ -264,31 +313,36 @@ def analyze_asset(ticker: str) -> tuple[pd.DataFrame, dict, dict]:
 
     # Clean early NaNs in inputs without discarding full history
     df = df.dropna(subset=['risk_total'])
+
+    # Price indicators the backtests and charts read; computed once here so they are cached with the rest
+    closes = df['Close'].to_numpy(dtype=np.float64)
+    df['sma_200'] = moving_average(closes, 200)
+    df['momentum_30'] = df['Close'].pct_change(30)
     
     # --- Trend / context metrics for AI prompt ---
     cowen_meta = {}
     if ticker.endswith("-USD") or ticker in ["GC=F", "SI=F"]:
-        sma_20w = df['Close'].rolling(window=140).mean()
+        sma_20w = moving_average(closes, 140)
         ema_21w = df['Close'].ewm(span=147, adjust=False).mean()
-        sma_50w = df['Close'].rolling(window=350).mean()
-        sma_200w = df['Close'].rolling(window=1400).mean()
+        sma_50w = moving_average(closes, 350)
+        sma_200w = moving_average(closes, 1400)
         df['sma_20w'] = sma_20w
         df['ema_21w'] = ema_21w
         df['sma_50w'] = sma_50w
         df['sma_200w'] = sma_200w
         cowen_meta = {
-            "bmsb_20w_sma": sma_20w.iloc[-1],
+            "bmsb_20w_sma": sma_20w[-1],
             "bmsb_21w_ema": ema_21w.iloc[-1],
-            "sma_50w": sma_50w.iloc[-1],
-            "sma_200w": sma_200w.iloc[-1] if not np.isnan(sma_200w.iloc[-1]) else 0,
+            "sma_50w": sma_50w[-1],
+            "sma_200w": sma_200w[-1] if not np.isnan(sma_200w[-1]) else 0,
         }
 
     # --- Cycle / context metrics for AI prompt ---
-    closes = df['Close']
-    last_price = closes.iloc[-1]
+    # Raw arrays: these are all scalar reads off the tail, no Series needed
+    last_price = closes[-1]
     def pct_return(days: int) -> float:
-        if len(closes) >= days and closes.iloc[-days] > 0:
-            return (last_price / closes.iloc[-days]) - 1
+        if len(closes) >= days and closes[-days] > 0:
+            return (last_price / closes[-days]) - 1
         return np.nan
     returns = {
         "ret_7d": pct_return(7),
@@ -296,17 +350,17 @@ def analyze_asset(ticker: str) -> tuple[pd.DataFrame, dict, dict]:
         "ret_90d": pct_return(90),
         "ret_365d": pct_return(365)
     }
-    ma50_val = closes.rolling(50).mean().iloc[-1]
-    ma200_val = closes.rolling(200).mean().iloc[-1]
+    ma50_val = closes[-50:].mean() if len(closes) >= 50 else np.nan
+    ma200_val = closes[-200:].mean() if len(closes) >= 200 else np.nan
     ma50_dist = (last_price / ma50_val - 1) if not np.isnan(ma50_val) and ma50_val > 0 else np.nan
     ma200_dist = (last_price / ma200_val - 1) if not np.isnan(ma200_val) and ma200_val > 0 else np.nan
-    rolling_max = closes.cummax()
+    rolling_max = np.maximum.accumulate(closes)
     drawdown_series = closes / rolling_max - 1
-    current_dd = drawdown_series.iloc[-1]
+    current_dd = drawdown_series[-1]
     max_dd = drawdown_series.min()
 
     # Metadata
-    last_risk = df['risk_total'].iloc[-1]
+    last_risk = df['risk_total'].to_numpy()[-1]
     metadata = {
         "ticker": ticker,
         "last_price": last_price,
@@ -324,6 +378,87 @@ def analyze_asset(ticker: str) -> tuple[pd.DataFrame, dict, dict]:
     
     return df, cowen_meta, metadata
 
+def _cache_paths(ticker: str) -> tuple[str, str]:
+    stem = os.path.join(CACHE_DIR, f"{ticker}_{date.today():%Y%m%d}")
+    return f"{stem}.parquet", f"{stem}.json"
+
+def _cache_prune(ticker: str, current: tuple[str, str]) -> None:
+    # Earlier-dated entries are never read again; drop them so the cache keeps one pair per ticker
+    keep = {os.path.basename(p) for p in current}
+    prefix = f"{ticker}_"
+    try:
+        with os.scandir(CACHE_DIR) as entries:
+            for entry in entries:
+                stem, ext = os.path.splitext(entry.name)
+                if (ext in (".parquet", ".json") and entry.name not in keep
+                        and stem.startswith(prefix) and stem[len(prefix):].isdigit()):
+                    os.remove(entry.path)
+    except OSError:
+        pass
+
+def uncached_tickers(tickers: list[str]) -> list[str]:
+    """Tickers with no same-day cache entry yet, i.e. the ones that still need a download."""
+    return [t for t in tickers if not all(os.path.exists(p) for p in _cache_paths(t))]
+
+def cached_analyze_asset(ticker: str, data: pd.DataFrame | None = None) -> tuple[pd.DataFrame, dict, dict]:
+    """
+    analyze_asset with a same-day disk cache: the DataFrame goes to parquet, the
+    metadata dicts to JSON, both keyed by ticker + date. Writing a new day's entry
+    deletes that ticker's earlier-dated files, so the cache stays one pair per ticker.
+    Failed analyses are not cached so the next call retries the fetch.
+    """
+    df_path, meta_path = _cache_paths(ticker)
+
+    if os.path.exists(df_path) and os.path.exists(meta_path):
+        try:
+            df = pd.read_parquet(df_path)
+            with open(meta_path) as f:
+                cached = json.load(f)
+            return df, cached["cowen_meta"], cached["metadata"]
+        except Exception as e:
+            print(f"  Cache read failed for {ticker} ({e}), recomputing...")
+
+    df, cowen_meta, metadata = analyze_asset(ticker, data)
+    if metadata.get("reason") or df.empty:
+        return df, cowen_meta, metadata
+
+    try:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        df.to_parquet(df_path, compression="zstd")
+        with open(meta_path, "w") as f:
+            json.dump({"cowen_meta": cowen_meta, "metadata": metadata}, f, default=float)
+    except Exception as e:
+        print(f"  Cache write failed for {ticker}: {e}")
+    else:
+        _cache_prune(ticker, (df_path, meta_path))
+    return df, cowen_meta, metadata
+
+def analyze_asset_extended(ticker: str, momentum_lookback: int = 30, trend_lookback: int = 90) -> tuple[pd.DataFrame, dict, dict]:
+    """
+    cached_analyze_asset plus the price features the portfolio managers score on,
+    read off a single Close array. metadata gains 'momentum' (return over the last
+    momentum_lookback days) and 'trend_strength' (share of the last trend_lookback
+    days closing above MA50).
+    """
+    df, cowen_meta, metadata = cached_analyze_asset(ticker)
+    if metadata.get("reason") or df.empty:
+        return df, cowen_meta, metadata
+
+    closes = df['Close'].to_numpy(dtype=np.float64)
+
+    momentum = 0.0
+    if len(closes) >= momentum_lookback:
+        momentum = (closes[-1] / closes[-momentum_lookback]) - 1
+
+    trend_strength = 0.5
+    if len(closes) >= trend_lookback:
+        window = closes[-trend_lookback:]
+        ma50 = moving_average(window, 50)
+        # Days without a full MA50 window are NaN and count as "not above"
+        trend_strength = np.count_nonzero(window > ma50) / len(window)
+
+    return df, cowen_meta, {**metadata, "momentum": momentum, "trend_strength": trend_strength}
+
 def calculate_mlr(gold_df, gdx_df, period=60):
     """
     Calculates Miner Leverage Ratio (MLR).
@@ -39,7 +39,8 @@ MOMENTUM_OVERRIDE = {
 
 def calculate_momentum_score(df, lookback=30):
     if len(df) < lookback: return 0.0
-    return (df['Close'].iloc[-1] / df['Close'].iloc[-lookback]) - 1
+    closes = df['Close'].to_numpy()
+    return (closes[-1] / closes[-lookback]) - 1
 
 def get_latest_risk_data(proxies):
     risk_data = {}
@@ -57,20 +57,29 @@ def calculate_market_breadth(close_df):
     if close_df.empty:
         return 0, "No Data"
 
-    # Calculate daily returns
-    returns = close_df.pct_change().dropna()
+    # Calculate daily returns on the raw matrix. Gaps carry the last close forward (pct_change's
+    # pad fill), so a missing day reads as flat; only days before an asset's first close drop out
+    closes = close_df.to_numpy(dtype=np.float64)
+    last_seen = np.where(np.isnan(closes), 0, np.arange(len(closes))[:, None])
+    np.maximum.accumulate(last_seen, axis=0, out=last_seen)
+    closes = closes[last_seen, np.arange(closes.shape[1])]
+    returns = closes[1:] / closes[:-1] - 1
+    returns = returns[~np.isnan(returns).any(axis=1)]
+    if len(returns) == 0:
+        return 0, "No Data"
     
     # +1 for Advance, -1 for Decline (0 for flat)
     advances = (returns > 0).sum(axis=1)
     declines = (returns < 0).sum(axis=1)
     
     net_daily = advances - declines
-    ad_line = net_daily.cumsum()
+    ad_line = np.cumsum(net_daily)
     
     # Analysis: Check trend of AD Line over last 30 days
-    recent_trend = ad_line.diff().tail(30).sum()
+    # (the 30 daily changes telescope to last minus the value 30 days back)
+    recent_trend = ad_line[-1] - ad_line[max(0, len(ad_line) - 31)]
     
-    current_val = ad_line.iloc[-1]
+    current_val = ad_line[-1]
     
     # Interpretation
     status = "NEUTRAL"
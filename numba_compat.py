@@ -0,0 +1,16 @@
+"""
+Optional Numba support.
+Kernels decorated with `njit` are compiled when numba is installed and run as
+plain Python otherwise, so every script keeps working without it.
+"""
+try:
+    from numba import njit
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
+
+    def njit(*args, **kwargs):
+        # Mirror numba's decorator forms: @njit, @njit(cache=True), @njit("f8(f8)")
+        if len(args) == 1 and callable(args[0]) and not kwargs:
+            return args[0]
+        return lambda fn: fn
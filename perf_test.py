@@ -12,7 +12,7 @@ start_time = time.time()
 # Expanding Window Loop (Simulating "Historic Analysis" for every day)
 # Start from day 100 to have enough data
 min_periods = 100
-risks = []
+risks = np.empty(days - min_periods)
 
 print(f"Running expanding window regression for {days} days...")
 
@@ -30,7 +30,7 @@ for i in range(min_periods, days):
     
     # Simple Z-score logic for test
     # (In real code we calculate ranking vs past residuals)
-    risks.append(resid)
+    risks[i - min_periods] = resid
 
 end_time = time.time()
 print(f"Total time: {end_time - start_time:.4f} seconds")
@@ -3,7 +3,7 @@ import numpy as np
 import os
 import sys
 from datetime import datetime, timedelta
-from enhanced_risk_analyzer import analyze_asset
+from enhanced_risk_analyzer import analyze_asset, fetch_many
 
 # CONFIG: v2.0 Thresholds
 V2_CONFIG = {
@@ -29,74 +29,89 @@ MAP_TICKER_TO_TIER = {
     "SPY":     "CORE"
 }
 
-def backtest_v2_logic(ticker, years=5, fee=0.001):
-    tier_name = MAP_TICKER_TO_TIER.get(ticker, "CORE")
-    cfg = V2_CONFIG[tier_name]
-    
+def _load_window(ticker, years=5, data=None):
+    """Risk history for the last `years`, or None if it can't be loaded or is too short."""
     try:
-        df, _, _ = analyze_asset(ticker)
+        df, _, _ = analyze_asset(ticker, data)
     except Exception as e:
         print(f"  Error loading {ticker}: {e}")
         return None
 
     # Filter for timeframe
     start_date = pd.Timestamp.now() - pd.DateOffset(years=years)
-    df = df[df.index >= start_date].copy()
+    df = df.loc[start_date:]
     if len(df) < 150: return None
+    return df
 
-    # Simulation Logic (Simplified v2.0)
-    positions = []
-    risk_col = 'risk_total'
-    
-    for i in range(len(df)):
-        risk = df[risk_col].iloc[i]
-        
-        # v2.0 Logic:
-        # > 0.85 (Crypto) / 0.80 (Core) -> 20% Moonbag (Min)
-        # > 0.75 (Crypto) / 0.70 (Core) -> 50% Reduce
-        # < 0.30 -> 140% Boost (Max)
-        # Else -> 100% Base
-        if risk > cfg['exit']:
-            pos = 0.2
-        elif risk > cfg['reduce']:
-            pos = 0.5
-        elif risk < 0.30:
-            pos = min(1.5, cfg['boost'])
-        else:
-            pos = 1.0
-            
-        positions.append(pos)
+def backtest_v2_matrix(frames, fee=0.001):
+    """
+    v2.0 logic for many tickers at once. v2 has no path-dependent state, so the
+    aligned close/risk histories are stacked into (T, N) matrices and every step
+    is a 2-D op with the per-tier thresholds broadcast across columns.
+    Days a ticker didn't trade carry its last close and position forward, so they
+    add a flat day (no return, no trade) and each column matches a solo run.
+    """
+    tickers = list(frames)
+    if not tickers: return []
+    tiers = [MAP_TICKER_TO_TIER.get(t, "CORE") for t in tickers]
+    exit_thr = np.array([V2_CONFIG[t]['exit'] for t in tiers])[None, :]
+    reduce_thr = np.array([V2_CONFIG[t]['reduce'] for t in tiers])[None, :]
+    boost = np.minimum(1.5, np.array([V2_CONFIG[t]['boost'] for t in tiers]))[None, :]
 
-    df['position'] = positions
-    df['trade'] = df['position'].diff().abs().fillna(0)
-    df['raw_ret'] = df['Close'].pct_change()
-    df['strat_ret'] = (df['position'].shift(1) * df['raw_ret']) - (df['trade'] * fee)
-    
-    # Cumulative returns
-    df['bh_cum'] = (1 + df['raw_ret']).cumprod()
-    df['strat_cum'] = (1 + df['strat_ret']).cumprod()
-    
-    # Metrics
-    final_strat = df['strat_cum'].iloc[-1]
-    final_bh = df['bh_cum'].iloc[-1]
-    alpha = final_strat - final_bh
-    
-    peak = df['strat_cum'].cummax()
-    max_dd = ((df['strat_cum'] - peak) / peak).min()
-    
-    bh_peak = df['bh_cum'].cummax()
-    bh_max_dd = ((df['bh_cum'] - bh_peak) / bh_peak).min()
-    
-    return {
+    # Align on the union of trading days
+    close_df = pd.concat([frames[t]['Close'] for t in tickers], axis=1, keys=tickers)
+    risk = pd.concat([frames[t]['risk_total'] for t in tickers], axis=1, keys=tickers).to_numpy(dtype=np.float64)
+    live = close_df.notna().to_numpy()
+    close = close_df.ffill().bfill().to_numpy(dtype=np.float64)
+
+    # v2.0 Logic (first matching band wins):
+    # > 0.85 (Crypto) / 0.80 (Core) -> 20% Moonbag (Min)
+    # > 0.75 (Crypto) / 0.70 (Core) -> 50% Reduce
+    # < 0.30 -> 140% Boost (Max)
+    # Else -> 100% Base
+    position = np.select(
+        [risk > exit_thr, risk > reduce_thr, risk < 0.30],
+        [np.broadcast_to(0.2, risk.shape), np.broadcast_to(0.5, risk.shape), np.broadcast_to(boost, risk.shape)],
+        default=1.0)
+    position = pd.DataFrame(np.where(live, position, np.nan)).ffill().bfill().to_numpy()
+
+    # Trades and returns (row 0 has no prior bar)
+    raw_ret = np.zeros_like(close)
+    raw_ret[1:] = close[1:] / close[:-1] - 1.0
+    trade = np.zeros_like(position)
+    trade[1:] = np.abs(np.diff(position, axis=0))
+    strat_ret = np.zeros_like(close)
+    strat_ret[1:] = position[:-1] * raw_ret[1:] - trade[1:] * fee
+
+    # Growth of 1.0, blank until each ticker's second bar (its first return)
+    listed = np.cumsum(live, axis=0) >= 2
+    # (summed log returns rather than a running product: one cumsum pass, no drift over long histories)
+    bh_cum = np.where(listed, np.exp(np.cumsum(np.log1p(raw_ret), axis=0)), np.nan)
+    strat_cum = np.where(listed, np.exp(np.cumsum(np.log1p(strat_ret), axis=0)), np.nan)
+
+    # Metrics (fmax/nanmin skip the blank leading rows like cummax/min do)
+    final_strat = strat_cum[-1]
+    final_bh = bh_cum[-1]
+    peak = np.fmax.accumulate(strat_cum, axis=0)
+    max_dd = np.nanmin((strat_cum - peak) / peak, axis=0)
+    bh_peak = np.fmax.accumulate(bh_cum, axis=0)
+    bh_max_dd = np.nanmin((bh_cum - bh_peak) / bh_peak, axis=0)
+
+    return [{
         "Ticker": ticker,
         "Tier": tier_name,
-        "v2_Return": f"{final_strat:.2f}x",
-        "B&H_Return": f"{final_bh:.2f}x",
-        "Alpha": f"{alpha:+.2f}x",
-        "v2_DD": f"{max_dd*100:.1f}%",
-        "B&H_DD": f"{bh_max_dd*100:.1f}%",
-        "Protection": f"{(abs(bh_max_dd) - abs(max_dd))*100:+.1f}%"
-    }
+        "v2_Return": f"{final_strat[j]:.2f}x",
+        "B&H_Return": f"{final_bh[j]:.2f}x",
+        "Alpha": f"{final_strat[j] - final_bh[j]:+.2f}x",
+        "v2_DD": f"{max_dd[j]*100:.1f}%",
+        "B&H_DD": f"{bh_max_dd[j]*100:.1f}%",
+        "Protection": f"{(abs(bh_max_dd[j]) - abs(max_dd[j]))*100:+.1f}%"
+    } for j, (ticker, tier_name) in enumerate(zip(tickers, tiers))]
+
+def backtest_v2_logic(ticker, years=5, fee=0.001):
+    df = _load_window(ticker, years)
+    if df is None: return None
+    return backtest_v2_matrix({ticker: df}, fee)[0]
 
 def run_suite():
     print(f"\n{'='*80}")
@@ -104,11 +119,15 @@ def run_suite():
     print(f" Date: {datetime.now().strftime('%Y-%m-%d')}")
     print(f"{'='*80}")
     
-    results = []
+    # One batched download, then the whole universe is simulated as one matrix
+    histories = fetch_many(list(MAP_TICKER_TO_TIER))
+    frames = {}
     for ticker in MAP_TICKER_TO_TIER.keys():
         print(f"Testing {ticker} ({MAP_TICKER_TO_TIER[ticker]})...")
-        m = backtest_v2_logic(ticker)
-        if m: results.append(m)
+        if ticker not in histories: continue
+        df = _load_window(ticker, data=histories[ticker])
+        if df is not None: frames[ticker] = df
+    results = backtest_v2_matrix(frames)
         
     res_df = pd.DataFrame(results)
     print("\n--- DETAILED QA REPORT ---")
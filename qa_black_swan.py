@@ -9,7 +9,7 @@ def audit_black_swan(ticker, start="2020-01-01", end="2020-06-01"):
     except:
         return None
 
-    df = df[(df.index >= start) & (df.index <= end)].copy()
+    df = df.loc[start:end]
     if df.empty: return None
 
     # Identify the Top and Bottom
@@ -14,7 +14,7 @@ def backtest_buy_timing(ticker, tier_name, years=5):
 
     # Filter for timeframe
     start_date = pd.Timestamp.now() - pd.DateOffset(years=years)
-    df = df[df.index >= start_date].copy()
+    df = df.loc[start_date:]
     if len(df) < 150: return None
 
     risk_col = 'risk_total'
@@ -4,6 +4,7 @@ import sqlite3
 import os
 from datetime import datetime
 from enhanced_risk_analyzer import analyze_asset
+from backtest_strategy import equity_curve
 import portfolio_db
 
 # CONFIG: v2.0 Thresholds
@@ -24,27 +25,20 @@ def backtest_cycle(ticker, tier_name, start_date="2021-01-01"):
     except Exception as e:
         return None
 
-    df = df[df.index >= start_date].copy()
+    df = df.loc[start_date:]
     if len(df) < 500: return None
 
-    positions = []
-    risk_col = 'risk_total'
+    risk = df['risk_total'].to_numpy()
+    position = np.select(
+        [risk > cfg['exit'], risk > cfg['reduce'], risk < 0.30],
+        [0.2, 0.5, cfg['boost']], default=1.0)
     
-    for i in range(len(df)):
-        risk = df[risk_col].iloc[i]
-        if risk > cfg['exit']: pos = 0.2
-        elif risk > cfg['reduce']: pos = 0.5
-        elif risk < 0.30: pos = cfg['boost']
-        else: pos = 1.0
-        positions.append(pos)
-
-    df['position'] = positions
-    df['raw_ret'] = df['Close'].pct_change()
-    df['strat_ret'] = (df['position'].shift(1) * df['raw_ret']).fillna(0)
-    
-    # Cumulative
-    df['bh_cum'] = (1 + df['raw_ret']).cumprod()
-    df['strat_cum'] = (1 + df['strat_ret']).cumprod()
+    # Returns and cumulative curves in one fee-free pass; the strategy starts flat at 1.0
+    _, raw_ret, strat_ret, bh_cum, strat_cum = equity_curve(
+        df['Close'].to_numpy(dtype=np.float64), position, 0.0, 1.0)
+    strat_ret[0] = 0.0
+    strat_cum[0] = 1.0
+    df = df.assign(position=position, raw_ret=raw_ret, strat_ret=strat_ret, bh_cum=bh_cum, strat_cum=strat_cum)
 
     # Bear Market Analysis (Max Drawdown from Peak)
     bh_peak = df['bh_cum'].cummax()
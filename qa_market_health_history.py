@@ -86,32 +86,39 @@ def run_historical_verification():
     # Divergence Check
     
     results = []
+    ad_vals = ad_line.to_numpy()
+    btc_vals = btc.to_numpy()
     
-    # Sample every 30 days to avoid spam
-    dates = btc.index[::30]
+    # Sample every 30 days to avoid spam. btc and ad_line share the closes index,
+    # so the sample positions index both directly; the correlation series has its
+    # own calendar, so its positions are looked up once for all samples (-1 = missing)
+    sample_pos = np.arange(0, len(btc), 30)
+    dates = btc.index[sample_pos]
+    if corr_check:
+        corr_vals = roll_corr_spx.to_numpy()
+        corr_pos = roll_corr_spx.index.get_indexer(dates)
     
     print("\n=== HISTORICAL SNAPSHOTS (REGIME CHECK) ===")
     print(f"{'Date':<12} | {'BTC Price':<10} | {'Breadth Trend':<20} | {'Corr SPX':<10} | {'Regime'}")
     print("-" * 80)
     
-    for d in dates:
-        if d not in ad_line.index or (corr_check and d not in roll_corr_spx.index): continue
+    for k, (idx, d) in enumerate(zip(sample_pos, dates)):
+        if corr_check and corr_pos[k] < 0: continue
         
         # Breadth Trend (Slope of last 30d)
-        # Find index loc
-        idx = ad_line.index.get_loc(d)
         if idx < 30: continue
         
-        ad_recent = ad_line.iloc[idx-30:idx]
-        b_trend = ad_recent.diff().sum() # Net change over 30d
+        # Net change over the 30d window: the diffs telescope to last - first,
+        # so read two points instead of slicing and summing the window
+        b_trend = ad_vals[idx-1] - ad_vals[idx-30]
         
         b_status = "Expanding" if b_trend > 20 else "NARROW/WEAK" if b_trend < -20 else "Neutral"
         
         # Corr
-        c_spx = roll_corr_spx.loc[d] if corr_check else 0
+        c_spx = corr_vals[corr_pos[k]] if corr_check else 0
         
         # Price
-        p = btc.loc[d]
+        p = btc_vals[idx]
         
         regime = "Normal"
         if b_status == "NARROW/WEAK" and c_spx > 0.5:
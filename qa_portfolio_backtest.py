@@ -4,6 +4,7 @@ import os
 import sqlite3
 from datetime import datetime
 from enhanced_risk_analyzer import analyze_asset
+from backtest_strategy import equity_curve
 import portfolio_db
 
 # CONFIG: v2.0 Thresholds
@@ -28,37 +29,22 @@ def backtest_v2_logic(ticker, tier_name, years=5, fee=0.001):
 
     # Filter for timeframe
     start_date = pd.Timestamp.now() - pd.DateOffset(years=years)
-    df = df[df.index >= start_date].copy()
+    df = df.loc[start_date:]
     if len(df) < 150: 
         print(f"  Insufficient data for {ticker}")
         return None
 
-    # Simulation Logic (Simplified v2.0)
-    positions = []
-    risk_col = 'risk_total'
+    # Simulation Logic (Simplified v2.0, first matching band wins)
+    risk = df['risk_total'].to_numpy()
+    position = np.select(
+        [risk > cfg['exit'], risk > cfg['reduce'], risk < 0.30],
+        [0.2, 0.5, min(1.5, cfg['boost'])], default=1.0)
     
-    for i in range(len(df)):
-        risk = df[risk_col].iloc[i]
-        
-        if risk > cfg['exit']:
-            pos = 0.2
-        elif risk > cfg['reduce']:
-            pos = 0.5
-        elif risk < 0.30:
-            pos = min(1.5, cfg['boost'])
-        else:
-            pos = 1.0
-            
-        positions.append(pos)
-
-    df['position'] = positions
-    df['trade'] = df['position'].diff().abs().fillna(0)
-    df['raw_ret'] = df['Close'].pct_change()
-    df['strat_ret'] = (df['position'].shift(1) * df['raw_ret']) - (df['trade'] * fee)
-    
-    # Cumulative returns
-    df['bh_cum'] = (1 + df['raw_ret']).cumprod()
-    df['strat_cum'] = (1 + df['strat_ret']).cumprod()
+    # Trades, returns and cumulative (growth of 1.0) curves in one pass, assigned together
+    trade, raw_ret, strat_ret, bh_cum, strat_cum = equity_curve(
+        df['Close'].to_numpy(dtype=np.float64), position, fee, 1.0)
+    df = df.assign(position=position, trade=trade, raw_ret=raw_ret, strat_ret=strat_ret,
+                   bh_cum=bh_cum, strat_cum=strat_cum)
     
     # Metrics
     final_strat = df['strat_cum'].iloc[-1]
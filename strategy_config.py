@@ -0,0 +1,87 @@
+"""
+Shared strategy configuration for the adaptive portfolio managers and the backtests,
+so the asset bands, v3 rules and weight normalization are defined once and can't
+drift between them.
+"""
+from collections import namedtuple
+
+import numpy as np
+
+# Asset Universe with ASYMMETRIC risk bands
+# Format: ticker: (base_weight, tier, min_w, max_w, risk_exit, risk_reduce, moonbag)
+ASSET_CONFIG = {
+    # Crypto - High volatility assets need WIDER bands
+    "BTC-USD": (0.18, "CRYPTO", 0.10, 0.30, 0.85, 0.75, 0.40),
+    "ETH-USD": (0.10, "CRYPTO", 0.05, 0.20, 0.85, 0.75, 0.40),
+
+    # Broad Market - Medium bands
+    "VGS.AX": (0.15, "CORE", 0.10, 0.25, 0.80, 0.70, 0.20),
+    "VAS.AX": (0.15, "CORE", 0.10, 0.20, 0.80, 0.70, 0.20),
+
+    # Commodities - Medium-tight bands
+    "GC=F": (0.08, "COMMODITY", 0.05, 0.15, 0.78, 0.68, 0.25),
+    "BHP.AX": (0.10, "COMMODITY", 0.05, 0.15, 0.75, 0.65, 0.25),
+    "RIO.AX": (0.07, "COMMODITY", 0.03, 0.12, 0.75, 0.65, 0.25),
+
+    # Tech/Thematic - Tight bands (bubble-prone)
+    "FANG.AX": (0.10, "GROWTH", 0.05, 0.15, 0.75, 0.65, 0.20),
+    "NDQ.AX": (0.05, "GROWTH", 0.03, 0.10, 0.75, 0.65, 0.20),
+
+    # Cash Reserve
+    "CASH": (0.02, "CORE", 0.00, 0.30, 1.0, 1.0, 0.0)
+}
+
+AssetSpec = namedtuple("AssetSpec", "base tier min_w max_w risk_exit risk_reduce moonbag")
+
+# Universe frozen at import: (ticker, spec) pairs in config order
+UNIVERSE = tuple((t, AssetSpec(*v)) for t, v in ASSET_CONFIG.items())
+FETCH_TICKERS = tuple(t for t, _ in UNIVERSE if t != "CASH")
+
+# Bands for tickers outside the universe (e.g. ad-hoc backtests)
+DEFAULT_ASSET = (0.1, "CORE", 0.05, 0.15, 0.75, 0.65, 0.2)
+
+# v3 rules (regime / conviction / confirmation / moonbag), read by the v3 manager and the backtests
+RULES = {
+    "regime_lookback": 90,
+    "bull_threshold": 0.35,
+    "bear_threshold": 0.65,
+    "min_hold_days": 45,
+    "exception_threshold": 0.95,
+    "confirmation_days": 5,
+    "spike_tolerance": 0.08,
+    "momentum_bonus": 0.5,
+    "max_moonbag": 0.70
+}
+
+# Numeric view for array access: one row per ticker, DEFAULT_ASSET as the last row
+# Columns: base_weight, min_w, max_w, risk_exit, risk_reduce, moonbag
+TICKERS = np.array(list(ASSET_CONFIG))
+TICKER_IDX = {t: i for i, t in enumerate(ASSET_CONFIG)}
+CONFIG_ARR = np.array([(v[0],) + v[2:] for v in ASSET_CONFIG.values()] + [(DEFAULT_ASSET[0],) + DEFAULT_ASSET[2:]])
+
+# Column-wise (SoA) view of the universe for the vectorized band logic (CONFIG_ARR minus the default row)
+BASE, MIN_W, MAX_W, RISK_EXIT, RISK_REDUCE, MOONBAG = np.ascontiguousarray(CONFIG_ARR[:-1].T)
+TIER = np.array([spec.tier for _, spec in UNIVERSE], dtype=object)
+# Tiers the macro damper applies to
+DAMPER_APPLIES = np.array([spec.tier in ("GROWTH", "CRYPTO") for _, spec in UNIVERSE])
+
+# Bounded normalization shared by the v2 and v3 managers
+def normalize_with_bounds(weights, lo, hi):
+    """
+    Scale weights to sum to 1 while keeping each inside [lo, hi].
+    Assets pushed past a bound are pinned there and the remainder is
+    redistributed over the free assets until nothing new violates.
+    """
+    w = np.asarray(weights, dtype=np.float64) / np.sum(weights)
+    fixed = np.zeros(len(w), dtype=bool)
+    for _ in range(len(w)):
+        violating = ~fixed & ((w < lo) | (w > hi))
+        if not violating.any():
+            break
+        fixed |= violating
+        np.clip(w, lo, hi, out=w)
+        free_total = w[~fixed].sum()
+        if free_total <= 0:
+            break
+        w[~fixed] *= (1.0 - w[fixed].sum()) / free_total
+    return w